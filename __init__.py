@@ -17,19 +17,32 @@ from CTFd.plugins.challenges import CHALLENGE_CLASSES
 from CTFd.plugins.flags import FLAG_CLASSES
 
 from .docker_challenge import DockerChallenge, docker_namespace
-from .user_flag import UserFlag, user_flag_namespace
+from .lifecycle import start_lifecycle_manager
+from .container_index import container_index
+from .image_catalog import image_catalog_namespace, start_image_catalog
+from .challenge_index import challenge_index
+from .user_flag import UserFlag, user_flag_namespace, cheater_log
+from .cheater_graph import cheater_graph_namespace, start_cheater_graph
 from .ssh_key import SSHKeys, SSHKeyForm, ssh_key_settings, ssh_key_namespace
 from .scoreboard import scoreboard_listing
 from .download import download, download_namespace
 from .terminal import terminal
 from .binary_ninja import binary_ninja_namespace
-from .grades import grades
+from .grades import (
+    grades,
+    populate_grade_counts,
+    rebuild_grades_command,
+    check_grades_command,
+)
+from .metrics import metrics_namespace
+from .verify_flags import verify_flags_command
 
 
 def load(app):
     dir_path = os.path.dirname(os.path.realpath(__file__))
 
     db.create_all()
+    populate_grade_counts()
 
     register_plugin_assets_directory(
         app, base_path="/plugins/CTFd-pwn-college-plugin/assets/"
@@ -57,6 +70,9 @@ def load(app):
     api.add_namespace(ssh_key_namespace, "/ssh_key")
     api.add_namespace(download_namespace, "/download")
     api.add_namespace(binary_ninja_namespace, "/binary_ninja")
+    api.add_namespace(image_catalog_namespace, "/images")
+    api.add_namespace(metrics_namespace, "/metrics")
+    api.add_namespace(cheater_graph_namespace, "/cheaters")
     app.register_blueprint(blueprint, url_prefix="/pwncollege_api/v1")
 
     app.register_blueprint(download)
@@ -67,3 +83,18 @@ def load(app):
     app.register_blueprint(grades)
     register_user_page_menu_bar("Grades", "/grades")
     register_admin_plugin_menu_bar("Grades", "/grades/all")
+
+    app.cli.add_command(verify_flags_command)
+    app.cli.add_command(rebuild_grades_command)
+    app.cli.add_command(check_grades_command)
+
+    # CLI commands create the app too, so background services are only started
+    # once a process begins serving requests
+    @app.before_first_request
+    def start_background_services():
+        start_lifecycle_manager(app)
+        container_index.start(app)
+        start_image_catalog(app)
+        challenge_index.start()
+        cheater_log.start(app)
+        start_cheater_graph(app)
@@ -0,0 +1,117 @@
+import time
+
+from CTFd.cache import cache
+
+from .settings import (
+    INSTANCE,
+    LAUNCH_TIMEOUT,
+    LAUNCH_RATE_LIMIT,
+    LAUNCH_RATE_WINDOW,
+    LAUNCH_RETRY_AFTER,
+    MAX_CONTAINERS,
+    MAX_MEMORY_COMMIT,
+)
+from .containers import CONTAINER_MEMORY, user_container_name
+from .docker_hosts import user_host
+from .lifecycle import capacity_summary
+from .container_index import container_index
+
+
+# How long a capacity snapshot of the docker hosts is trusted
+CAPACITY_SNAPSHOT_TIMEOUT = 5
+
+
+def begin_launch(user_id, token, **request):
+    """Mark a launch as in flight, or return the user's launch that is in flight."""
+    key = f"{user_container_name(user_id)}_launching"
+    in_flight = {"token": token, **request}
+    if cache.add(key, in_flight, timeout=LAUNCH_TIMEOUT):
+        return None
+    return cache.get(key) or in_flight
+
+
+def end_launch(user_id):
+    cache.delete(f"{user_container_name(user_id)}_launching")
+
+
+def coalesced_launch(in_flight, **request):
+    # Only an identical launch can join the one in flight, a launch of another
+    # challenge (or mode) would otherwise be reported ready for the wrong one
+    if {key: in_flight.get(key) for key in request} != request:
+        return {
+            "success": False,
+            "error": "Another challenge is already starting, try again shortly",
+        }
+    if in_flight["token"] == "sync":
+        return {"success": False, "error": "Your challenge is already starting"}
+    return {"success": True, "job_id": in_flight["token"], "status": "queued"}
+
+
+def retry_later(reason, retry_after):
+    retry_after = max(int(retry_after), 1)
+    return {
+        "success": False,
+        "queued": True,
+        "retry_after": retry_after,
+        "error": f"{reason}, retry in {retry_after} seconds",
+    }
+
+
+def check_rate(user_id):
+    if not LAUNCH_RATE_LIMIT:
+        return None
+
+    now = time.time()
+    window = int(now // LAUNCH_RATE_WINDOW)
+    key = f"{user_container_name(user_id)}_launches_{window}"
+    cache.add(key, 0, timeout=LAUNCH_RATE_WINDOW * 2)
+    if cache.inc(key) > LAUNCH_RATE_LIMIT:
+        return retry_later("Too many launches", (window + 1) * LAUNCH_RATE_WINDOW - now)
+
+
+def capacity_snapshot():
+    snapshot = cache.get(f"{INSTANCE}_capacity_snapshot")
+    if snapshot is None:
+        hosts = [host for host in capacity_summary() if host["available"]]
+        snapshot = {
+            "containers": sum(host["containers"] for host in hosts),
+            "total_memory": sum(host["total_memory"] for host in hosts),
+        }
+        cache.set(
+            f"{INSTANCE}_capacity_snapshot",
+            snapshot,
+            timeout=CAPACITY_SNAPSHOT_TIMEOUT,
+        )
+        # Containers admitted since the snapshot are not part of it yet
+        cache.set(f"{INSTANCE}_capacity_admitted", 0, timeout=0)
+    return snapshot
+
+
+def has_container(user_id):
+    if container_index.available():
+        return container_index.get(user_id) is not None
+    return user_host(user_id) is not None
+
+
+def check_capacity(user_id):
+    if not MAX_CONTAINERS and not MAX_MEMORY_COMMIT:
+        return None
+
+    # Replacing an existing container does not add to the commitment
+    if has_container(user_id):
+        return None
+
+    snapshot = capacity_snapshot()
+    containers = snapshot["containers"] + cache.inc(f"{INSTANCE}_capacity_admitted")
+    committed_memory = containers * CONTAINER_MEMORY
+
+    if (MAX_CONTAINERS and containers > MAX_CONTAINERS) or (
+        MAX_MEMORY_COMMIT
+        and committed_memory > snapshot["total_memory"] * MAX_MEMORY_COMMIT
+    ):
+        cache.dec(f"{INSTANCE}_capacity_admitted")
+        return retry_later("Servers are at capacity", LAUNCH_RETRY_AFTER)
+
+
+def admit_launch(user_id):
+    return check_rate(user_id) or check_capacity(user_id)
@@ -57,6 +57,11 @@ function workon(challenge_id, practice=false) {
         body: JSON.stringify(params)
     }).then(function (response) {
         return response.json();
+    }).then(function (result) {
+        if (result.success && result.job_id) {
+            return wait_launch_job(result.job_id);
+        }
+        return result;
     }).then(function (result) {
         var result_notification = $('#result-notification');
         var result_message = $('#result-message');
@@ -75,6 +80,14 @@ function workon(challenge_id, practice=false) {
             result_message.html(message);
             result_notification.addClass('alert alert-info alert-dismissable text-center');
         }
+        else if (result.queued) {
+            result_message.html(result.error);
+            result_notification.addClass('alert alert-info alert-dismissable text-center');
+            element.addClass('animate-flicker');
+            setTimeout(function () {
+                workon(challenge_id, practice);
+            }, result.retry_after * 1000);
+        }
         else {
             result_message.html(result.error);
             result_notification.addClass('alert alert-warning alert-dismissable text-center');
@@ -84,6 +97,33 @@ function workon(challenge_id, practice=false) {
     });
 }
 
+function wait_launch_job(job_id) {
+    return CTFd.fetch('/pwncollege_api/v1/docker/jobs/' + job_id, {
+        method: 'GET',
+        credentials: 'same-origin',
+        headers: {
+            'Accept': 'application/json'
+        }
+    }).then(function (response) {
+        return response.json();
+    }).then(function (result) {
+        if (!result.success) {
+            return result;
+        }
+        if (result.status === 'ready') {
+            return {'success': true, 'ssh': result.ssh};
+        }
+        if (result.status === 'failed') {
+            return {'success': false, 'error': result.error};
+        }
+        return new Promise(function (resolve) {
+            setTimeout(resolve, 500);
+        }).then(function () {
+            return wait_launch_job(job_id);
+        });
+    });
+}
+
 function download(challenge_id) {
     const token = btoa(JSON.stringify({'challenge_id': challenge_id}));
     window.location.pathname = '/download/' + token;
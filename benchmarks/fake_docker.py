@@ -0,0 +1,262 @@
+import re
+import json
+import time
+import uuid
+import struct
+import threading
+import collections
+import socketserver
+import http.server
+import urllib.parse
+
+
+class FakeDockerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A stand-in for dockerd on a unix socket, speaking the subset of the Engine API the plugin uses.
+
+    Every request sleeps for `latency` seconds before it is answered, or for
+    `latencies[endpoint]` when that endpoint has its own latency. Requests are
+    counted per endpoint in `calls`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, *, latency=0.0, latencies=None, mem_total=64 * 2**30):
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.mem_total = mem_total
+        self.containers = {}
+        self.execs = {}
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        super().__init__(path, FakeDockerHandler)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.shutdown()
+        self.server_close()
+
+    def find(self, name):
+        name = name.lstrip("/")
+        with self.lock:
+            for container in self.containers.values():
+                if name in (container["Id"], container["Name"].lstrip("/")):
+                    return container
+
+
+class FakeDockerHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    routes = [
+        ("GET", r"/containers/json", "list_containers"),
+        ("POST", r"/containers/create", "create_container"),
+        ("GET", r"/containers/(?P<name>[^/]+)/json", "inspect_container"),
+        ("POST", r"/containers/(?P<name>[^/]+)/start", "start_container"),
+        ("POST", r"/containers/(?P<name>[^/]+)/kill", "kill_container"),
+        ("POST", r"/containers/(?P<name>[^/]+)/restart", "restart_container"),
+        ("POST", r"/containers/(?P<name>[^/]+)/wait", "wait_container"),
+        ("POST", r"/containers/(?P<name>[^/]+)/rename", "rename_container"),
+        ("PUT", r"/containers/(?P<name>[^/]+)/archive", "put_archive"),
+        ("GET", r"/containers/(?P<name>[^/]+)/changes", "container_changes"),
+        ("GET", r"/containers/(?P<name>[^/]+)/stats", "container_stats"),
+        ("POST", r"/containers/(?P<name>[^/]+)/exec", "create_exec"),
+        ("POST", r"/exec/(?P<id>[^/]+)/start", "start_exec"),
+        ("GET", r"/exec/(?P<id>[^/]+)/json", "inspect_exec"),
+        ("GET", r"/images/(?P<name>.+)/json", "inspect_image"),
+        ("GET", r"/info", "info"),
+        ("GET", r"/events", "events"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_request(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        path = re.sub(r"^/v[0-9.]+", "", url.path)
+        self.query = dict(urllib.parse.parse_qsl(url.query))
+
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        for route_method, pattern, endpoint in self.routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                break
+        else:
+            return self.respond(404, {"message": f"page not found: {path}"})
+
+        self.server.calls[endpoint] += 1
+        time.sleep(self.server.latencies.get(endpoint, self.server.latency))
+        getattr(self, endpoint)(**match.groupdict())
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def respond(self, status, data=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def container_or_404(self, name):
+        container = self.server.find(name)
+        if not container:
+            self.respond(404, {"message": f"No such container: {name}"})
+        return container
+
+    def list_containers(self):
+        filters = json.loads(self.query.get("filters", "{}"))
+        names = filters.get("name", [])
+        with self.server.lock:
+            containers = list(self.server.containers.values())
+        self.respond(
+            200,
+            [
+                {
+                    "Id": container["Id"],
+                    "Names": [container["Name"]],
+                    "Image": container["Config"]["Image"],
+                    "Labels": container["Config"]["Labels"],
+                    "State": container["State"]["Status"],
+                }
+                for container in containers
+                if all(name in container["Name"] for name in names)
+            ],
+        )
+
+    def create_container(self):
+        config = json.loads(self.body)
+        name = self.query.get("name") or uuid.uuid4().hex[:12]
+        if self.server.find(name):
+            return self.respond(409, {"message": f"Conflict: {name} is in use"})
+
+        container_id = uuid.uuid4().hex * 2
+        with self.server.lock:
+            self.server.containers[container_id] = {
+                "Id": container_id,
+                "Name": f"/{name}",
+                "Config": {
+                    "Image": config.get("Image"),
+                    "Env": config.get("Env") or [],
+                    "Labels": config.get("Labels") or {},
+                    "Hostname": config.get("Hostname"),
+                },
+                "HostConfig": config.get("HostConfig") or {},
+                "State": {"Status": "created", "StartedAt": "0001-01-01T00:00:00Z"},
+                "Changes": [],
+            }
+        self.respond(201, {"Id": container_id, "Warnings": []})
+
+    def inspect_container(self, name):
+        container = self.container_or_404(name)
+        if container:
+            self.respond(200, container)
+
+    def start_container(self, name):
+        container = self.container_or_404(name)
+        if container:
+            container["State"] = {
+                "Status": "running",
+                "StartedAt": time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z"),
+            }
+            self.respond(204)
+
+    def kill_container(self, name):
+        container = self.container_or_404(name)
+        if container:
+            container["State"]["Status"] = "exited"
+            self.respond(204)
+
+    def restart_container(self, name):
+        self.start_container(name)
+
+    def wait_container(self, name):
+        container = self.container_or_404(name)
+        if container:
+            # Auto removed containers are removed once they have been waited on
+            if container["HostConfig"].get("AutoRemove"):
+                with self.server.lock:
+                    self.server.containers.pop(container["Id"], None)
+            self.respond(200, {"StatusCode": 137})
+
+    def rename_container(self, name):
+        container = self.container_or_404(name)
+        if container:
+            container["Name"] = f"/{self.query['name']}"
+            self.respond(204)
+
+    def put_archive(self, name):
+        container = self.container_or_404(name)
+        if container:
+            self.respond(200)
+
+    def container_changes(self, name):
+        container = self.container_or_404(name)
+        if container:
+            self.respond(200, container["Changes"])
+
+    def container_stats(self, name):
+        container = self.container_or_404(name)
+        if container:
+            self.respond(200, {"cpu_stats": {"cpu_usage": {"total_usage": 0}}})
+
+    def create_exec(self, name):
+        container = self.container_or_404(name)
+        if container:
+            exec_id = uuid.uuid4().hex * 2
+            self.server.execs[exec_id] = json.loads(self.body)["Cmd"]
+            self.respond(201, {"Id": exec_id})
+
+    def start_exec(self, id):
+        command = " ".join(self.server.execs.get(id, []))
+        if "findmnt" in command:
+            output = b"rw,nosuid,relatime\n"
+        elif "readlink" in command:
+            output = re.search(r"readlink -e '([^']*)'", command).group(1).encode()
+        else:
+            output = b""
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.docker.raw-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.flush()
+        # The client reads the stream from the raw socket once the headers are parsed
+        time.sleep(0.005)
+        if output:
+            self.wfile.write(struct.pack(">BxxxL", 1, len(output)) + output)
+        self.close_connection = True
+
+    def inspect_exec(self, id):
+        self.respond(200, {"ExitCode": 0, "Running": False})
+
+    def inspect_image(self, name):
+        self.respond(
+            200,
+            {"Id": f"sha256:{'0' * 64}", "RepoDigests": [], "Size": 0},
+        )
+
+    def info(self):
+        self.respond(200, {"MemTotal": self.server.mem_total})
+
+    def events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self.wfile.flush()
+        self.server.stopped.wait()
+        self.close_connection = True
@@ -0,0 +1,96 @@
+"""Benchmark user flag size and verification throughput, singly and in batches.
+
+Run from the CTFd root, with this plugin installed under CTFd/plugins:
+
+    python CTFd/plugins/CTFd-pwn-college-plugin/benchmarks/flag_benchmark.py \\
+        --flags 100000 --batch-size 1000
+
+Both the legacy itsdangerous format and the compact format are measured. The
+baseline builds a fresh serializer and compiles the envelope pattern for every
+legacy flag, as flag verification used to.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import importlib
+
+from itsdangerous.url_safe import URLSafeSerializer
+
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+SECRET = "benchmark" * 4
+
+
+def baseline_unserialize_user_flag(user_flag, *, secret):
+    user_flag = re.sub(".+?{(.+)}", r"\1", user_flag)[::-1]
+    data = URLSafeSerializer(secret).loads(user_flag)
+    data.append(None)
+    account_id, challenge_id, challenge_data, *_ = data
+    return account_id, challenge_id, challenge_data
+
+
+def measure(label, count, function):
+    started = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:10} {count / elapsed:12.0f} flags/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flags", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("PWN_COLLEGE_INSTANCE", "benchmark")
+    os.environ.setdefault("HOST_DATA_PATH", "/tmp")
+
+    plugin = importlib.import_module(f"CTFd.plugins.{os.path.basename(PLUGIN_DIR)}")
+    utils = importlib.import_module(".utils", plugin.__name__)
+
+    def challenge_data(i):
+        # Roughly one in seven flags carries a babysuid path
+        return "/usr/bin/python3.8" if i % 7 == 0 else None
+
+    expected = [(i, i % 100, challenge_data(i)) for i in range(args.flags)]
+
+    failed = False
+    for format, serialize in (
+        ("legacy", utils.legacy_user_flag),
+        ("compact", utils.compact_user_flag),
+    ):
+        flags = ["pwn_college{" + serialize(SECRET, *data) + "}" for data in expected]
+        size = sum(map(len, flags)) / len(flags)
+        print(f"{format} flags: {size:.1f} characters on average")
+
+        def baseline():
+            for flag in flags:
+                baseline_unserialize_user_flag(flag, secret=SECRET)
+
+        def single():
+            for flag in flags:
+                utils.unserialize_user_flag(flag, secret=SECRET)
+
+        def batch():
+            for i in range(0, len(flags), args.batch_size):
+                utils.unserialize_user_flags(
+                    flags[i : i + args.batch_size], secret=SECRET
+                )
+
+        if format == "legacy":
+            measure("baseline", len(flags), baseline)
+        measure("single", len(flags), single)
+        measure("batch", len(flags), batch)
+
+        if utils.unserialize_user_flags(flags, secret=SECRET) != expected:
+            print(f"{format} verification mismatch")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Check that compute_grades matches the original per-category grade queries.
+
+Run from the CTFd root, with this plugin installed under CTFd/plugins:
+
+    python CTFd/plugins/CTFd-pwn-college-plugin/benchmarks/grades_equivalence.py \\
+        --users 30
+
+The fixture has hidden and zero-value challenges, a category without a deadline,
+awards, and solves on both sides of every deadline. Every user is graded with
+when unset, before, between and after the deadlines.
+"""
+
+import os
+import sys
+import random
+import argparse
+import datetime
+import tempfile
+import importlib
+
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def reference_compute_grades(grades, user_id, when=None):
+    """compute_grades as it was before it became a single aggregated query."""
+    from CTFd.models import db, Challenges, Solves, Awards
+
+    deadlines = grades.deadlines
+    average = grades.average
+
+    results = []
+    available_total = 0
+    solves_total = 0
+
+    makeup_grades = []
+    makeup_solves_total = 0
+
+    challenges = (
+        db.session.query(Challenges.category, db.func.count())
+        .filter(Challenges.state == "visible")
+        .filter(Challenges.value > 0)
+        .group_by(Challenges.category)
+    )
+    for category, num_available in challenges:
+        solves = (
+            Solves.query.filter_by(user_id=user_id)
+            .join(Challenges)
+            .filter(Challenges.category == category)
+        )
+
+        if when:
+            solves = solves.filter(Solves.date < when)
+
+        makeup_solves = solves
+
+        deadline = deadlines.get(category)
+        if deadline:
+            solves = solves.filter(Solves.date < deadline)
+
+        num_solves = solves.count()
+        makeup_num_solves = makeup_solves.count()
+
+        available_total += num_available
+        solves_total += num_solves
+        makeup_solves_total += makeup_num_solves
+
+        results.append(
+            {
+                "category": category,
+                "due": str(deadline or ""),
+                "completed": f"{num_solves}/{num_available}",
+                "grade": num_solves / num_available,
+            }
+        )
+
+        if category == "babyauto":
+            continue
+        makeup_grades.append(makeup_num_solves / num_available)
+
+    max_time = datetime.datetime.max
+    results.sort(key=lambda k: (deadlines.get(k["category"], max_time), k["category"]))
+
+    weighted_grades = [g["grade"] for g in results if g["category"] != "babyauto"]
+    makeup_grade = average(makeup_grades)
+    weighted_grades += [makeup_grade] * len(weighted_grades)
+    overall_grade = average(weighted_grades)
+    overall_grade += (
+        next(g["grade"] for g in results if g["category"] == "babyauto") * 0.10
+    )
+
+    num_awards = Awards.query.filter_by(user_id=user_id).count()
+    extra_credit = num_awards * 0.01
+    results.append(
+        {
+            "category": "extra",
+            "due": "",
+            "completed": f"{num_awards}",
+            "grade": extra_credit,
+        }
+    )
+    overall_grade += extra_credit
+
+    results.append(
+        {
+            "category": "makeup",
+            "due": "",
+            "completed": f"{makeup_solves_total}/{available_total}",
+            "grade": makeup_grade,
+        }
+    )
+
+    results.append(
+        {
+            "category": "overall",
+            "due": "",
+            "completed": f"{solves_total}/{available_total}",
+            "grade": overall_grade,
+        }
+    )
+
+    return results
+
+
+def create_fixtures(app, grades, users, seed):
+    from CTFd.models import db, Users, Challenges, Solves, Awards
+
+    rng = random.Random(seed)
+    with app.app_context():
+        challenges = []
+        for category in [*grades.deadlines, "undated"]:
+            for i in range(rng.randint(2, 6)):
+                challenge = Challenges(
+                    name=f"{category}{i}",
+                    category=category,
+                    description=category,
+                    value=rng.choice([1, 1, 1, 0]),
+                    state=rng.choice(["visible"] * 5 + ["hidden"]),
+                )
+                db.session.add(challenge)
+                challenges.append(challenge)
+        db.session.commit()
+
+        user_ids = []
+        for i in range(users):
+            user = Users(name=f"user{i}", email=f"user{i}@example.com", password="x")
+            db.session.add(user)
+            db.session.commit()
+            user_ids.append(user.id)
+
+        for user_id in user_ids:
+            for challenge in challenges:
+                if rng.random() < 0.5:
+                    continue
+                deadline = grades.deadlines.get(
+                    challenge.category, datetime.datetime(2020, 12, 1)
+                )
+                date = deadline + datetime.timedelta(
+                    days=rng.randint(-20, 20), seconds=rng.randint(0, 3600)
+                )
+                db.session.add(
+                    Solves(
+                        user_id=user_id,
+                        challenge_id=challenge.id,
+                        ip="127.0.0.1",
+                        provided="flag",
+                        date=date,
+                    )
+                )
+            for _ in range(rng.randint(0, 3)):
+                db.session.add(Awards(user_id=user_id, name="award", value=0))
+        db.session.commit()
+
+        return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="pwncollege_grades_")
+    os.environ.update(
+        {
+            "PWN_COLLEGE_INSTANCE": "benchmark",
+            "HOST_DATA_PATH": directory,
+            "CHALLENGES_PATH": os.path.join(directory, "challenges"),
+            "IMAGE_CATALOG_INTERVAL": "0",
+            "TESTING_DATABASE_URL": f"sqlite:///{directory}/ctfd.db",
+        }
+    )
+
+    from CTFd import create_app
+    from CTFd.config import TestingConfig
+
+    app = create_app(TestingConfig)
+    plugin = importlib.import_module(f"CTFd.plugins.{os.path.basename(PLUGIN_DIR)}")
+    grades = importlib.import_module(".grades", plugin.__name__)
+
+    user_ids = create_fixtures(app, grades, args.users, args.seed)
+
+    deadlines = sorted(grades.deadlines.values())
+    whens = [
+        None,
+        deadlines[0] - datetime.timedelta(days=7),
+        deadlines[len(deadlines) // 2],
+        deadlines[-1] + datetime.timedelta(days=7),
+    ]
+
+    checked = 0
+    mismatches = 0
+    with app.app_context():
+        for user_id in user_ids:
+            for when in whens:
+                expected = reference_compute_grades(grades, user_id, when)
+                actual = grades.compute_grades(user_id, when)
+                checked += 1
+                if actual != expected:
+                    mismatches += 1
+                    print(f"User {user_id} at {when}:")
+                    print(f"  expected {expected}")
+                    print(f"  actual   {actual}")
+
+    print(f"{checked} gradings checked, {mismatches} mismatched")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
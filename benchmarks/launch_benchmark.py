@@ -0,0 +1,169 @@
+"""Benchmark container launches through the Flask test client against a fake docker daemon.
+
+Run from the CTFd root, with this plugin installed under CTFd/plugins:
+
+    python CTFd/plugins/CTFd-pwn-college-plugin/benchmarks/launch_benchmark.py \\
+        --users 50 --rounds 2 --concurrency 16 --latency 0.01
+
+Each user launches the same challenge `--rounds` times in a row, so later rounds
+exercise the in-place challenge swap.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import importlib
+import statistics
+import concurrent.futures
+
+from fake_docker import FakeDockerDaemon
+
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def create_fixtures(app, plugin, users):
+    from CTFd.models import db, Users
+    from CTFd.utils import set_config
+
+    with app.app_context():
+        set_config("setup", True)
+        challenge = plugin.docker_challenge.DockerChallenges(
+            name="level1",
+            category="benchmark",
+            description="benchmark",
+            value=1,
+            state="visible",
+            docker_image_name="benchmark",
+        )
+        db.session.add(challenge)
+        for i in range(users):
+            db.session.add(
+                Users(
+                    name=f"user{i}", email=f"user{i}@example.com", password="password"
+                )
+            )
+        db.session.commit()
+        return challenge.id
+
+
+def login(app, name):
+    client = app.test_client()
+    client.get("/login")
+    with client.session_transaction() as session:
+        nonce = session.get("nonce")
+    client.post("/login", data={"name": name, "password": "password", "nonce": nonce})
+    with client.session_transaction() as session:
+        nonce = session.get("nonce")
+    return client, nonce
+
+
+def run_user(client, nonce, challenge_id, rounds):
+    latencies = []
+    failures = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        response = client.post(
+            "/pwncollege_api/v1/docker",
+            json={"challenge_id": challenge_id, "practice": False},
+            headers={"CSRF-Token": nonce},
+        )
+        latencies.append(time.perf_counter() - started)
+        result = response.get_json() or {}
+        if not result.get("success"):
+            failures.append(result.get("error", response.status_code))
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--challenge-size", type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="pwncollege_benchmark_")
+    socket_path = os.path.join(directory, "docker.sock")
+    daemon = FakeDockerDaemon(socket_path, latency=args.latency).start()
+
+    os.environ.update(
+        {
+            "DOCKER_HOST": f"unix://{socket_path}",
+            "PWN_COLLEGE_INSTANCE": "benchmark",
+            "HOST_DATA_PATH": directory,
+            "CHALLENGES_PATH": os.path.join(directory, "challenges"),
+            "IMAGE_CATALOG_INTERVAL": "0",
+            "LAUNCH_WORKERS": "0",
+            "LAUNCH_RATE_LIMIT": "0",
+            "TESTING_DATABASE_URL": f"sqlite:///{directory}/ctfd.db",
+        }
+    )
+
+    # The challenge index scans the challenges when the plugin is loaded
+    challenge_dir = os.path.join(
+        os.environ["CHALLENGES_PATH"], "global", "benchmark", "level1"
+    )
+    os.makedirs(challenge_dir)
+    with open(os.path.join(challenge_dir, "level1"), "wb") as f:
+        f.write(os.urandom(args.challenge_size))
+
+    from CTFd import create_app
+    from CTFd.config import TestingConfig
+
+    app = create_app(TestingConfig)
+    plugin = importlib.import_module(f"CTFd.plugins.{os.path.basename(PLUGIN_DIR)}")
+    plugin.docker_challenge = importlib.import_module(
+        ".docker_challenge", plugin.__name__
+    )
+
+    challenge_id = create_fixtures(app, plugin, args.users)
+    sessions = [login(app, f"user{i}") for i in range(args.users)]
+
+    calls_before = sum(daemon.calls.values()) - daemon.calls["events"]
+    endpoint_calls_before = dict(daemon.calls)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(args.concurrency) as executor:
+        results = list(
+            executor.map(
+                lambda session: run_user(*session, challenge_id, args.rounds),
+                sessions,
+            )
+        )
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for user, _ in results for latency in user]
+    failures = [failure for _, user in results for failure in user]
+    launches = len(latencies)
+    calls = sum(daemon.calls.values()) - daemon.calls["events"] - calls_before
+
+    print(f"launches:          {launches} ({len(failures)} failed)")
+    print(f"launches/sec:      {launches / elapsed:.1f}")
+    print(f"latency mean:      {statistics.mean(latencies) * 1000:.1f} ms")
+    for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        print(f"latency {label}:       {percentile(latencies, fraction) * 1000:.1f} ms")
+    print(f"daemon calls/launch: {calls / launches:.2f}")
+    for endpoint, count in sorted(daemon.calls.items()):
+        count -= endpoint_calls_before.get(endpoint, 0)
+        if count and endpoint != "events":
+            print(f"  {endpoint:20} {count / launches:.2f}")
+    if failures:
+        print(f"failures: {sorted(set(map(str, failures)))}")
+
+    daemon.stop()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
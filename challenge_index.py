@@ -0,0 +1,215 @@
+import os
+import sys
+import stat
+import time
+import ctypes
+import ctypes.util
+import struct
+import threading
+
+from .settings import CHALLENGES_PATH, CHALLENGE_INDEX_INTERVAL
+
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+WATCH_MASK = (
+    IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.add_watch_call = libc.inotify_add_watch
+        self.add_watch_call.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.rm_watch_call = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        wd = self.add_watch_call(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def read_events(self):
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+
+class ChallengeIndex:
+    """In-memory index of `CHALLENGES_PATH/{account_id|global}/{category}/{challenge}`.
+
+    The tree is scanned in the background and kept fresh with inotify, falling
+    back to a rescan every `CHALLENGE_INDEX_INTERVAL` seconds when inotify is not
+    available. Until the first scan completes, lookups go to the filesystem.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.entries = {}
+        self.watches = {}
+        self.inotify = None
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def lookup(self, owner, category, challenge):
+        return self.entries.get(owner, {}).get(category, {}).get(challenge)
+
+    def watch(self, parts):
+        if not self.inotify:
+            return
+        try:
+            wd = self.inotify.add_watch(os.path.join(self.root, *parts), WATCH_MASK)
+        except OSError as e:
+            print(
+                f"Challenge index falling back to rescans: {e}",
+                file=sys.stderr,
+                flush=True,
+            )
+            self.inotify = None
+            return
+        self.watches[wd] = parts
+
+    @staticmethod
+    def subdirectories(path):
+        try:
+            with os.scandir(path) as entries:
+                return [entry.name for entry in entries if entry.is_dir()]
+        except OSError:
+            return []
+
+    def scan_category(self, owner, category):
+        self.watch((owner, category))
+        challenges = {}
+        try:
+            with os.scandir(os.path.join(self.root, owner, category)) as entries:
+                for entry in entries:
+                    try:
+                        challenges[entry.name] = stat.S_ISDIR(entry.stat().st_mode)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return challenges
+
+    def scan_owner(self, owner):
+        self.watch((owner,))
+        return {
+            category: self.scan_category(owner, category)
+            for category in self.subdirectories(os.path.join(self.root, owner))
+        }
+
+    def scan(self):
+        self.watch(())
+        entries = {
+            owner: self.scan_owner(owner) for owner in self.subdirectories(self.root)
+        }
+        with self.lock:
+            self.entries = entries
+        self.ready = True
+
+    def handle_event(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            self.scan()
+            return
+
+        parts = self.watches.get(wd)
+        if mask & IN_IGNORED:
+            self.watches.pop(wd, None)
+            return
+        if parts is None or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            return
+
+        removed = mask & (IN_DELETE | IN_MOVED_FROM)
+        with self.lock:
+            if len(parts) == 0:
+                if removed:
+                    self.entries.pop(name, None)
+                else:
+                    self.entries[name] = self.scan_owner(name)
+            elif len(parts) == 1:
+                (owner,) = parts
+                categories = self.entries.setdefault(owner, {})
+                if removed:
+                    categories.pop(name, None)
+                else:
+                    categories[name] = self.scan_category(owner, name)
+            else:
+                owner, category = parts
+                challenges = self.entries.setdefault(owner, {}).setdefault(category, {})
+                if removed:
+                    challenges.pop(name, None)
+                    return
+                try:
+                    st = os.stat(os.path.join(self.root, owner, category, name))
+                    challenges[name] = stat.S_ISDIR(st.st_mode)
+                except OSError:
+                    challenges.pop(name, None)
+
+    def watch_loop(self):
+        while self.inotify:
+            try:
+                events = list(self.inotify.read_events())
+            except OSError as e:
+                print(
+                    f"Challenge index inotify failed: {e}", file=sys.stderr, flush=True
+                )
+                self.inotify = None
+                break
+            for event in events:
+                self.handle_event(*event)
+
+    def rescan_loop(self):
+        while True:
+            time.sleep(CHALLENGE_INDEX_INTERVAL)
+            try:
+                self.scan()
+            except Exception as e:
+                print(
+                    f"Challenge index rescan failed: {e}", file=sys.stderr, flush=True
+                )
+
+    def start(self):
+        try:
+            self.inotify = Inotify()
+        except (OSError, AttributeError) as e:
+            print(
+                f"Challenge index falling back to rescans: {e}",
+                file=sys.stderr,
+                flush=True,
+            )
+
+        def run():
+            self.scan()
+            if self.inotify:
+                threading.Thread(target=self.watch_loop, daemon=True).start()
+            self.rescan_loop()
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+challenge_index = ChallengeIndex(CHALLENGES_PATH)
@@ -0,0 +1,184 @@
+import sys
+import time
+import heapq
+import threading
+import collections
+
+from flask import request
+from flask_restx import Namespace, Resource
+from CTFd.models import db, Users
+from CTFd.utils.decorators import admins_only
+
+from .settings import CHEATER_GRAPH_REBUILD_INTERVAL
+from .user_flag import Cheaters
+
+
+SYNC_BATCH_SIZE = 10000
+
+# Records can commit out of id order, so every sync re-reads this many ids below
+# the newest one seen and only applies the ones it has not seen yet
+TRAILING_IDS = 1000
+
+
+class CheaterGraph:
+    """Union-find over cheater -> cheatee edges, extended from new Cheaters rows."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parent = {}
+        self.members = {}
+        self.records = collections.Counter()
+        self.offenses = collections.Counter()
+        self.sources = collections.defaultdict(set)
+        self.last_id = 0
+        self.recent_ids = set()
+
+    def find(self, user_id):
+        if user_id not in self.parent:
+            self.parent[user_id] = user_id
+            self.members[user_id] = [user_id]
+            return user_id
+
+        root = user_id
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[user_id] != root:
+            self.parent[user_id], user_id = root, self.parent[user_id]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.members[a].extend(self.members.pop(b))
+        self.records[a] += self.records.pop(b, 0)
+        return a
+
+    def add(self, cheater_id, cheatee_id):
+        self.offenses[cheater_id] += 1
+        self.sources[cheater_id].add(cheatee_id)
+        self.records[self.union(cheater_id, cheatee_id)] += 1
+
+    def sync(self):
+        with self.lock:
+            after_id = max(self.last_id - TRAILING_IDS, 0)
+            while True:
+                rows = (
+                    db.session.query(
+                        Cheaters.id, Cheaters.cheater_id, Cheaters.cheatee_id
+                    )
+                    .filter(Cheaters.id > after_id)
+                    .order_by(Cheaters.id)
+                    .limit(SYNC_BATCH_SIZE)
+                    .all()
+                )
+                if not rows:
+                    break
+                for cheater_record_id, cheater_id, cheatee_id in rows:
+                    if cheater_record_id in self.recent_ids:
+                        continue
+                    self.add(cheater_id, cheatee_id)
+                    self.recent_ids.add(cheater_record_id)
+                after_id = rows[-1][0]
+                self.last_id = max(self.last_id, after_id)
+
+            floor = self.last_id - TRAILING_IDS
+            self.recent_ids = {
+                record_id for record_id in self.recent_ids if record_id > floor
+            }
+
+    def largest_clusters(self, limit):
+        clusters = heapq.nlargest(
+            limit,
+            self.members.items(),
+            key=lambda item: (len(item[1]), self.records[item[0]]),
+        )
+        return [
+            {
+                "size": len(members),
+                "records": self.records[root],
+                "members": sorted(members),
+            }
+            for root, members in clusters
+        ]
+
+    def repeat_offenders(self, limit):
+        offenders = heapq.nlargest(
+            limit, self.offenses.items(), key=lambda item: item[1]
+        )
+        return [
+            {
+                "user_id": user_id,
+                "records": records,
+                "sources": sorted(self.sources[user_id]),
+            }
+            for user_id, records in offenders
+        ]
+
+
+# Built in the background, and replaced by a fresh graph on every rebuild so that
+# records removed by user deletions drop out of the clusters
+cheater_graph = None
+
+
+def cheater_graph_loop(app):
+    global cheater_graph
+    while True:
+        with app.app_context():
+            try:
+                graph = CheaterGraph()
+                graph.sync()
+                cheater_graph = graph
+            except Exception as e:
+                print(
+                    f"Failed to build cheater graph: {e}", file=sys.stderr, flush=True
+                )
+            finally:
+                db.session.remove()
+        if not CHEATER_GRAPH_REBUILD_INTERVAL:
+            return
+        time.sleep(CHEATER_GRAPH_REBUILD_INTERVAL)
+
+
+def start_cheater_graph(app):
+    thread = threading.Thread(target=cheater_graph_loop, args=(app,), daemon=True)
+    thread.start()
+
+
+cheater_graph_namespace = Namespace(
+    "cheaters", description="Endpoint to analyze flag sharing between users"
+)
+
+
+@cheater_graph_namespace.route("")
+class CheaterClusters(Resource):
+    @admins_only
+    def get(self):
+        limit = request.args.get("limit", 10, type=int)
+
+        graph = cheater_graph
+        if graph is None:
+            return {"success": False, "error": "Cheater graph is still being built"}
+
+        graph.sync()
+        with graph.lock:
+            clusters = graph.largest_clusters(limit)
+            offenders = graph.repeat_offenders(limit)
+
+        user_ids = {user_id for cluster in clusters for user_id in cluster["members"]}
+        user_ids.update(offender["user_id"] for offender in offenders)
+        names = dict(
+            db.session.query(Users.id, Users.name).filter(Users.id.in_(user_ids))
+        )
+        for cluster in clusters:
+            cluster["members"] = [
+                {"user_id": user_id, "name": names.get(user_id)}
+                for user_id in cluster["members"]
+            ]
+        for offender in offenders:
+            offender["name"] = names.get(offender["user_id"])
+
+        return {"success": True, "clusters": clusters, "offenders": offenders}
@@ -0,0 +1,154 @@
+import sys
+import time
+import datetime
+import threading
+
+from .settings import INSTANCE
+from .containers import get_container_launch
+from .docker_hosts import docker_hosts, host_client
+from .lifecycle import touch_container
+
+
+USER_PREFIX = f"{INSTANCE}_user_"
+
+
+def container_user_id(name):
+    if not name or not name.startswith(USER_PREFIX):
+        return None
+    try:
+        return int(name[len(USER_PREFIX) :])
+    except ValueError:
+        return None
+
+
+def docker_timestamp(value):
+    # Docker reports nanosecond precision, which strptime does not accept
+    started_at = datetime.datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+    return started_at.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class ContainerIndex:
+    """In-process index of user containers, kept current by the docker events stream.
+
+    Entries map a user id to the container id, challenge id, state, start time and
+    host of the user's container. The index is only consulted once every host has
+    been reconciled and is being watched; until then callers ask the daemon.
+    """
+
+    def __init__(self):
+        self.containers = {}
+        self.ready_hosts = set()
+        self.lock = threading.Lock()
+
+    def available(self):
+        return self.ready_hosts.issuperset(docker_hosts())
+
+    def get(self, user_id):
+        entry = self.containers.get(user_id)
+        if not entry:
+            return None
+
+        entry = dict(entry)
+        launch = get_container_launch(user_id)
+        if launch.get("container_id") == entry["container_id"]:
+            entry["challenge_id"] = launch["challenge_id"]
+        return entry
+
+    def update(self, user_id, **fields):
+        with self.lock:
+            entry = self.containers.get(user_id)
+            if not entry or entry["container_id"] != fields.get("container_id"):
+                entry = {"challenge_id": None, "started_at": time.time()}
+            self.containers[user_id] = {**entry, **fields}
+
+    def remove(self, user_id, container_id):
+        with self.lock:
+            entry = self.containers.get(user_id)
+            if entry and entry["container_id"] == container_id:
+                del self.containers[user_id]
+
+    def reconcile(self, host, docker_client):
+        entries = {}
+        for container in docker_client.containers.list(filters={"name": USER_PREFIX}):
+            user_id = container_user_id(container.name)
+            if user_id is None:
+                continue
+
+            challenge_id = None
+            for env in container.attrs["Config"]["Env"]:
+                if env.startswith("CHALLENGE_ID="):
+                    try:
+                        challenge_id = int(env[len("CHALLENGE_ID=") :])
+                    except ValueError:
+                        pass
+
+            entries[user_id] = {
+                "container_id": container.id,
+                "challenge_id": challenge_id,
+                "state": container.status,
+                "started_at": docker_timestamp(container.attrs["State"]["StartedAt"]),
+                "host": host,
+            }
+
+        with self.lock:
+            for user_id, entry in list(self.containers.items()):
+                if entry["host"] == host:
+                    del self.containers[user_id]
+            self.containers.update(entries)
+
+    def handle_event(self, host, event):
+        action = event.get("Action", "")
+        container_id = event["Actor"]["ID"]
+        attributes = event["Actor"].get("Attributes", {})
+        user_id = container_user_id(attributes.get("name"))
+
+        if action == "rename":
+            old_user_id = container_user_id(attributes.get("oldName", "").lstrip("/"))
+            if old_user_id is not None:
+                self.remove(old_user_id, container_id)
+
+        if user_id is None:
+            return
+
+        if action in ("start", "rename"):
+            self.update(
+                user_id,
+                container_id=container_id,
+                state="running",
+                started_at=event.get("time", time.time()),
+                host=host,
+            )
+        elif action in ("die", "destroy"):
+            self.remove(user_id, container_id)
+        elif action.startswith("exec_start") or action == "attach":
+            touch_container(user_id, event.get("time"))
+
+    def watch(self, app, host):
+        while True:
+            try:
+                docker_client = host_client(host)
+                # Subscribe before reconciling so that no event is missed in between
+                events = docker_client.events(
+                    decode=True, filters={"type": "container"}
+                )
+                self.reconcile(host, docker_client)
+                self.ready_hosts.add(host)
+                with app.app_context():
+                    for event in events:
+                        self.handle_event(host, event)
+            except Exception as e:
+                print(
+                    f"Docker events for host {host} failed: {e}",
+                    file=sys.stderr,
+                    flush=True,
+                )
+            self.ready_hosts.discard(host)
+            time.sleep(5)
+
+    def start(self, app):
+        for host in docker_hosts():
+            thread = threading.Thread(target=self.watch, args=(app, host), daemon=True)
+            thread.start()
+
+
+container_index = ContainerIndex()
@@ -0,0 +1,123 @@
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+
+from .settings import INSTANCE, CONTAINER_POOL_SIZE, CONTAINER_POOL_SIZES
+from .docker_hosts import host_client
+from .containers import (
+    user_container_name,
+    run_user_container,
+    check_home_mount,
+    kill_container,
+)
+
+
+# Containers are started with the user's home and challenges bind mounted, so a
+# warm container can only ever be claimed by the user it was started for. Each
+# user keeps at most one standby container (for the image they last launched),
+# and the pool size bounds how many standby containers exist per image. A
+# container's hostname names its challenge and cannot change once it is created,
+# so a standby is only claimed to relaunch the challenge it was started for.
+STANDBY_LABEL = f"college.pwn.{INSTANCE}.standby"
+
+pool_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def pool_size(image_name):
+    return CONTAINER_POOL_SIZES.get(image_name, CONTAINER_POOL_SIZE)
+
+
+def standby_container_name(user_id):
+    return f"{INSTANCE}_standby_{user_id}"
+
+
+def claim_standby(docker_client, user_id, image_name, hostname):
+    if not pool_size(image_name):
+        return None
+
+    try:
+        container = docker_client.containers.get(standby_container_name(user_id))
+    except docker.errors.NotFound:
+        return None
+
+    if (
+        container.labels.get(STANDBY_LABEL) != image_name
+        or container.attrs["Config"]["Hostname"] != hostname
+    ):
+        pool_executor.submit(kill_container, container)
+        return None
+
+    if container.status != "running":
+        return None
+
+    try:
+        current = docker_client.containers.get(user_container_name(user_id))
+        current.rename(f"{INSTANCE}_retired_{user_id}_{uuid.uuid4().hex[:8]}")
+        pool_executor.submit(kill_container, current)
+    except docker.errors.NotFound:
+        pass
+    except docker.errors.APIError:
+        return None
+
+    try:
+        container.rename(user_container_name(user_id))
+    except docker.errors.APIError:
+        return None
+
+    return container
+
+
+def refill_standby(user_id, image_name, hostname, host):
+    if not pool_size(image_name):
+        return
+    pool_executor.submit(start_standby, user_id, image_name, hostname, host)
+
+
+def start_standby(user_id, image_name, hostname, host):
+    docker_client = host_client(host)
+
+    for name in (standby_container_name(user_id), f"{INSTANCE}_warming_{user_id}"):
+        try:
+            kill_container(docker_client.containers.get(name))
+        except docker.errors.NotFound:
+            pass
+
+    # Claimed containers keep their label, so only count unclaimed standbys
+    standbys = [
+        container
+        for container in docker_client.containers.list(
+            filters={"label": f"{STANDBY_LABEL}={image_name}"}
+        )
+        if container.name.startswith(f"{INSTANCE}_standby_")
+    ]
+    # A full pool is left alone rather than evicting another user's standby
+    if len(standbys) >= pool_size(image_name):
+        return
+
+    try:
+        container = run_user_container(
+            docker_client,
+            image_name,
+            user_id,
+            name=f"{INSTANCE}_warming_{user_id}",
+            hostname=hostname,
+            labels={STANDBY_LABEL: image_name},
+        )
+    except Exception as e:
+        print(
+            f"Standby container failed for user {user_id}: {e}",
+            file=sys.stderr,
+            flush=True,
+        )
+        return
+
+    # Only mount checked containers are renamed into the pool
+    error = check_home_mount(container)
+    if error:
+        kill_container(container)
+        print(f"{error} for standby of user {user_id}", file=sys.stderr, flush=True)
+        return
+
+    container.rename(standby_container_name(user_id))
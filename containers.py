@@ -0,0 +1,91 @@
+import os
+import json
+
+import docker
+from CTFd.cache import cache
+
+from .settings import INSTANCE, HOST_DATA_PATH
+
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+with open(f"{dir_path}/seccomp.json") as f:
+    SECCOMP = json.dumps(json.load(f))
+
+
+CONTAINER_MEMORY = 1000 * 1024 * 1024
+
+
+def user_container_name(user_id):
+    return f"{INSTANCE}_user_{user_id}"
+
+
+def run_user_container(
+    docker_client, image_name, user_id, *, name, hostname, environment=None, labels=None
+):
+    return docker_client.containers.run(
+        image_name,
+        ["/bin/bash", "-c", "while true; do su ctf; done"],
+        name=name,
+        hostname=hostname,
+        environment=environment or {},
+        labels=labels or {},
+        mounts=[
+            docker.types.Mount(
+                "/home/ctf",
+                f"{HOST_DATA_PATH}/homes/nosuid/{user_id}",
+                "bind",
+                propagation="shared",
+            ),
+            docker.types.Mount(
+                "/challenges",
+                f"{HOST_DATA_PATH}/challenges/{user_id}",
+                "bind",
+                read_only=True,
+            ),
+        ],
+        network="none",
+        cap_add=["SYS_PTRACE"],
+        security_opt=[f"seccomp={SECCOMP}"],
+        pids_limit=100,
+        mem_limit=CONTAINER_MEMORY,
+        detach=True,
+        tty=True,
+        stdin_open=True,
+        remove=True,
+    )
+
+
+def check_home_mount(container):
+    exit_code, output = container.exec_run("findmnt --output OPTIONS /home/ctf")
+    if exit_code != 0:
+        return "Home directory failed to mount"
+    elif b"nosuid" not in output:
+        return "Home directory failed to mount as nosuid"
+
+
+def kill_container(container):
+    try:
+        container.kill()
+        container.wait(condition="removed")
+    except docker.errors.NotFound:
+        pass
+
+
+def set_container_launch(user_id, **launch):
+    # Claimed and reused containers keep the environment they were started with,
+    # so the running challenge is tracked outside of the container
+    cache.set(f"{user_container_name(user_id)}_launch", launch, timeout=0)
+
+
+def get_container_launch(user_id):
+    return cache.get(f"{user_container_name(user_id)}_launch") or {}
+
+
+def get_container_challenge(container, user_id):
+    launch = get_container_launch(user_id)
+    if launch.get("container_id") == container.id:
+        return launch["challenge_id"]
+
+    for env in container.attrs["Config"]["Env"]:
+        if env.startswith("CHALLENGE_ID"):
+            return int(env[len("CHALLENGE_ID=") :])
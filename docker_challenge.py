@@ -1,13 +1,10 @@
-import os
 import sys
-import json
+import uuid
 import pathlib
-import tempfile
-import tarfile
 
 import docker
 import requests
-from flask import request, Blueprint
+from flask import request, current_app, Blueprint
 from flask_restx import Namespace, Resource
 from CTFd.models import (
     db,
@@ -20,18 +17,19 @@ from CTFd.models import (
     Hints,
 )
 from CTFd.utils.user import get_ip, get_current_user
-from CTFd.utils.decorators import authed_only
+from CTFd.utils.decorators import authed_only, admins_only
 from CTFd.utils.uploads import delete_file
 from CTFd.plugins.challenges import BaseChallenge
 from CTFd.plugins.flags import get_flag_class
 
-from .settings import INSTANCE, HOST_DATA_PATH
-from .utils import serialize_user_flag, challenge_path
-
-
-dir_path = os.path.dirname(os.path.realpath(__file__))
-with open(f"{dir_path}/seccomp.json") as f:
-    SECCOMP = json.dumps(json.load(f))
+from .settings import LAUNCH_WORKERS
+from .utils import challenge_path
+from .containers import user_container_name, get_container_challenge
+from .docker_hosts import host_client, user_host
+from .lifecycle import capacity_summary
+from .container_index import container_index
+from .admission import begin_launch, end_launch, coalesced_launch, admit_launch
+from .launch import launch_container, submit_launch, get_launch_job
 
 
 class DockerChallenges(Challenges):
@@ -92,6 +90,9 @@ class RunDocker(Resource):
         category = challenge.category
         challenge = challenge.name
 
+        selected_path = None
+        chall_path = None
+
         if category == "babysuid":
             # TODO: make babysuid not so hacked in
             selected_path = data.get("selected_path")
@@ -106,179 +107,106 @@ class RunDocker(Resource):
                 )
                 return {"success": False, "error": "Challenge data does not exist"}
 
-        docker_client = docker.from_env()
-
-        container_name = f"{INSTANCE}_user_{user.id}"
-
-        try:
-            container = docker_client.containers.get(container_name)
-            container.kill()
-            container.wait(condition="removed")
-        except docker.errors.NotFound:
-            pass
-
-        # try:
-        #     response = requests.post(f"http://home_daemon/init/{user.id}").json()
-        #     if not response["success"]:
-        #         error = response["error"]
-        #         print(
-        #             f"Home daemon failed to init home for user {user.id}: {error}",
-        #             file=sys.stderr,
-        #             flush=True,
-        #         )
-        #         return {"success": False, "error": "Home daemon failed to init home"}
-        # except Exception as e:
-        #     print(f"Failed to reach home daemon: {e}", file=sys.stderr, flush=True)
-        #     return {"success": False, "error": "Failed to reach home daemon"}
-
-        try:
-            container = docker_client.containers.run(
-                image_name,
-                ["/bin/bash", "-c", "while true; do su ctf; done"],
-                name=container_name,
-                hostname=f"{category}_{challenge}",
-                environment={"CHALLENGE_ID": str(challenge_id)},
-                mounts=[
-                    docker.types.Mount(
-                        "/home/ctf",
-                        f"{HOST_DATA_PATH}/homes/nosuid/{user.id}",
-                        "bind",
-                        propagation="shared",
-                    ),
-                    docker.types.Mount(
-                        "/challenges",
-                        f"{HOST_DATA_PATH}/challenges/{user.id}",
-                        "bind",
-                        read_only=True,
-                    ),
-                ],
-                network="none",
-                cap_add=["SYS_PTRACE"],
-                security_opt=[f"seccomp={SECCOMP}"],
-                pids_limit=100,
-                mem_limit="1000m",
-                detach=True,
-                tty=True,
-                stdin_open=True,
-                remove=True,
-            )
-        except Exception as e:
-            print(f"Docker failed: {e}", file=sys.stderr, flush=True)
-            return {"success": False, "error": "Docker failed"}
-
-        exit_code, output = container.exec_run("findmnt --output OPTIONS /home/ctf")
-        if exit_code != 0:
-            container.kill()
-            container.wait(condition="removed")
-            print(
-                f"Home directory failed to mount for user {user.id}",
-                file=sys.stderr,
-                flush=True,
-            )
-            return {"success": False, "error": "Home directory failed to mount"}
-        elif b"nosuid" not in output:
-            container.kill()
-            container.wait(condition="removed")
-            print(
-                f"Home directory failed to mount as nosuid for user {user.id}",
-                file=sys.stderr,
-                flush=True,
-            )
+        launch = {
+            "user_id": user.id,
+            "account_id": account_id,
+            "challenge_id": challenge_id,
+            "image_name": image_name,
+            "category": category,
+            "challenge": challenge,
+            "practice": practice,
+            "selected_path": selected_path,
+            "chall_path": chall_path,
+        }
+
+        job_id = uuid.uuid4().hex if LAUNCH_WORKERS else "sync"
+
+        # Duplicate launches (double clicks) join the launch already in flight
+        launch_request = {
+            "challenge_id": challenge_id,
+            "practice": bool(practice),
+            "selected_path": selected_path,
+        }
+        in_flight = begin_launch(user.id, job_id, **launch_request)
+        if in_flight:
+            return coalesced_launch(in_flight, **launch_request)
+
+        rejection = admit_launch(user.id)
+        if rejection:
+            end_launch(user.id)
+            return rejection
+
+        if not LAUNCH_WORKERS:
+            try:
+                return launch_container(**launch)
+            finally:
+                end_launch(user.id)
+
+        if not submit_launch(current_app._get_current_object(), job_id, **launch):
+            end_launch(user.id)
             return {
                 "success": False,
-                "error": "Home directory failed to mount as nosuid",
+                "error": "Too many launches in progress, try again later",
             }
 
-        extra_data = None
-
-        if category == "babysuid":
-            # TODO: make babysuid not so hacked in
-
-            # No command injection please
-            selected_path = selected_path.replace("'", "").replace('"', "")
-
-            exit_code, output = container.exec_run(
-                f"""/bin/sh -c \"
-                test -f '{selected_path}' &&
-                chmod u+s '{selected_path}' &&
-                readlink -e '{selected_path}';
-                \""""
-            )
-
-            if exit_code != 0:
-                container.kill()
-                container.wait(condition="removed")
-                return {"success": False, "error": "Invalid path"}
-
-            selected_path = output.decode("latin").strip()
-
-            suid_path = selected_path
-            extra_data = selected_path
-
-        else:
+        return {"success": True, "job_id": job_id, "status": "queued"}
 
-            def simple_tar(path, name=None):
-                f = tempfile.NamedTemporaryFile()
-                t = tarfile.open(mode="w", fileobj=f)
+    @authed_only
+    def get(self):
+        user = get_current_user()
 
-                abs_path = os.path.abspath(path)
-                t.add(abs_path, arcname=(name or os.path.basename(path)))
+        if container_index.available():
+            entry = container_index.get(user.id)
+            if not entry:
+                return {"success": False, "error": "No container"}
+            if entry["challenge_id"] is None:
+                return {"success": False, "error": "No challenge id"}
+            return {"success": True, "challenge_id": entry["challenge_id"]}
 
-                t.close()
-                f.seek(0)
-                return f
+        host = user_host(user.id)
+        if host is None:
+            return {"success": False, "error": "No container"}
 
-            with simple_tar(chall_path, f"{category}_{challenge}") as tar:
-                container.put_archive("/", tar)
+        docker_client = host_client(host)
 
-            suid_path = f"/{category}_{challenge}"
+        container_name = user_container_name(user.id)
 
-        container.exec_run(
-            f"""/bin/sh -c \"
-            chmod -R 4755 {suid_path};
-            touch /flag;
-            chmod 400 /flag;
-            \""""
-        )
+        try:
+            container = docker_client.containers.get(container_name)
+        except docker.errors.NotFound:
+            return {"success": False, "error": "No container"}
 
-        if not practice:
-            flag = serialize_user_flag(account_id, challenge_id, extra_data)
+        try:
+            challenge_id = get_container_challenge(container, user.id)
+        except ValueError:
+            return {"success": False, "error": "Invalid challenge id"}
 
-        else:
-            flag = serialize_user_flag(0, 0, 0)
-            container.exec_run(
-                f"""/bin/sh -c \"
-                chmod 4755 /usr/bin/sudo;
-                adduser ctf sudo;
-                echo 'ctf ALL=(ALL) NOPASSWD:ALL' >> /etc/sudoers;
-                echo '127.0.0.1\t{category}_{challenge}' >> /etc/hosts;
-                \""""
-            )
+        if challenge_id is None:
+            return {"success": False, "error": "No challenge id"}
 
-        flag = f"pwn_college{{{flag}}}"
-        container.exec_run(f"/bin/sh -c \"echo '{flag}' > /flag\"")
+        return {"success": True, "challenge_id": challenge_id}
 
-        return {"success": True, "ssh": f"ssh {INSTANCE}@{INSTANCE}.pwn.college"}
 
+@docker_namespace.route("/jobs/<job_id>")
+class LaunchJob(Resource):
     @authed_only
-    def get(self):
+    def get(self, job_id):
         user = get_current_user()
 
-        docker_client = docker.from_env()
+        job = get_launch_job(job_id)
+        if not job or job["user_id"] != user.id:
+            return {"success": False, "error": "Invalid job"}
 
-        container_name = f"{INSTANCE}_user_{user.id}"
+        job = {
+            key: value
+            for key, value in job.items()
+            if key not in ("user_id", "deadline")
+        }
+        return {"success": True, **job}
 
-        try:
-            container = docker_client.containers.get(container_name)
-        except docker.errors.NotFound:
-            return {"success": False, "error": "No container"}
 
-        for env in container.attrs["Config"]["Env"]:
-            if env.startswith("CHALLENGE_ID"):
-                try:
-                    challenge_id = int(env[len("CHALLENGE_ID=") :])
-                    return {"success": True, "challenge_id": challenge_id}
-                except ValueError:
-                    return {"success": False, "error": "Invalid challenge id"}
-        else:
-            return {"success": False, "error": "No challenge id"}
+@docker_namespace.route("/capacity")
+class Capacity(Resource):
+    @admins_only
+    def get(self):
+        return {"success": True, "hosts": capacity_summary()}
@@ -0,0 +1,81 @@
+import sys
+
+import docker
+from CTFd.cache import cache
+
+from .settings import INSTANCE, DOCKER_HOSTS
+from .containers import CONTAINER_MEMORY, user_container_name
+
+
+# The empty host is the local daemon configured by the environment
+LOCAL_HOST = ""
+
+
+def docker_hosts():
+    return DOCKER_HOSTS or [LOCAL_HOST]
+
+
+def host_client(host):
+    if host == LOCAL_HOST:
+        return docker.from_env()
+    return docker.DockerClient(base_url=host)
+
+
+def host_websocket_url(host, path):
+    if host.startswith("unix://"):
+        return f"http://unix:{host[len('unix://'):]}:{path}"
+    elif host.startswith("tcp://"):
+        return f"http://{host[len('tcp://'):]}{path}"
+    elif host.startswith("http://"):
+        return f"{host}{path}"
+    return f"http://unix:/tmp/docker.sock:{path}"
+
+
+def set_user_host(user_id, host):
+    cache.set(f"{user_container_name(user_id)}_host", host, timeout=0)
+
+
+def user_host(user_id):
+    host = cache.get(f"{user_container_name(user_id)}_host")
+    if host is not None:
+        return host
+
+    for host in docker_hosts():
+        try:
+            host_client(host).containers.get(user_container_name(user_id))
+        except docker.errors.NotFound:
+            continue
+        except Exception as e:
+            print(f"Docker host {host} unreachable: {e}", file=sys.stderr, flush=True)
+            continue
+        set_user_host(user_id, host)
+        return host
+
+
+def host_load(host):
+    docker_client = host_client(host)
+    containers = docker_client.containers.list(
+        filters={"name": f"{INSTANCE}_"}, sparse=True
+    )
+    committed_memory = len(containers) * CONTAINER_MEMORY
+    total_memory = docker_client.info()["MemTotal"]
+    return committed_memory / total_memory, len(containers)
+
+
+def place_container():
+    hosts = docker_hosts()
+    if len(hosts) == 1:
+        return hosts[0]
+
+    placement = None
+    for host in hosts:
+        try:
+            load = host_load(host)
+        except Exception as e:
+            print(f"Docker host {host} unreachable: {e}", file=sys.stderr, flush=True)
+            continue
+        if placement is None or load < placement[0]:
+            placement = (load, host)
+
+    if placement:
+        return placement[1]
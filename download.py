@@ -11,7 +11,7 @@ from CTFd.utils.decorators import authed_only
 from CTFd.utils.security.signing import serialize, unserialize
 
 from .settings import INSTANCE
-from .utils import challenge_path
+from .utils import challenge_entry
 from .docker_challenge import DockerChallenges
 
 
@@ -46,9 +46,10 @@ def download_challenge(token):
     except:
         abort(404)
 
-    chall_path = challenge_path(account_id, category, challenge)
-    if not chall_path:
+    entry = challenge_entry(account_id, category, challenge)
+    if not entry:
         abort(404)
+    chall_path, is_dir = entry
 
     filename = f"{category}_{challenge}"
 
@@ -62,13 +63,11 @@ def download_challenge(token):
         memory_file.seek(0)
         return memory_file
 
-    if os.path.isfile(chall_path):
-        file_download = chall_path
-    elif os.path.isdir(chall_path):
+    if is_dir:
         file_download = simple_zip(chall_path)
         filename += ".zip"
     else:
-        abort(404)
+        file_download = chall_path
 
     return send_file(
         file_download,
@@ -1,11 +1,32 @@
+import io
+import csv
+import sys
+import json
+import bisect
 import datetime
 
-from flask import Blueprint, render_template, request
-from sqlalchemy.sql import or_
+import click
+from flask import (
+    Blueprint,
+    Response,
+    render_template,
+    request,
+    jsonify,
+    abort,
+    stream_with_context,
+)
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.sql import and_, or_
 from CTFd.models import db, Challenges, Solves, Awards, Users
+from CTFd.cache import cache
 from CTFd.utils.user import get_current_user, is_admin
 from CTFd.utils.decorators import authed_only, admins_only
 
+from .settings import INSTANCE
+
 
 grades = Blueprint("grades", __name__, template_folder="assets/grades/")
 
@@ -25,6 +46,24 @@ deadlines = {
 }
 
 
+class GradeCounts(db.Model):
+    __tablename__ = "grade_counts"
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    category = db.Column(db.String(80), primary_key=True)
+    solves = db.Column(db.Integer, default=0)
+    makeup_solves = db.Column(db.Integer, default=0)
+
+
+class AwardCounts(db.Model):
+    __tablename__ = "award_counts"
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    awards = db.Column(db.Integer, default=0)
+
+
 def average(data):
     data = list(data)
     if not data:
@@ -32,7 +71,18 @@ def average(data):
     return sum(data) / len(data)
 
 
-def compute_grades(user_id, when=None):
+def on_time_condition():
+    return or_(
+        Challenges.category.notin_(list(deadlines)),
+        *(
+            and_(Challenges.category == category, Solves.date < deadline)
+            for category, deadline in deadlines.items()
+        ),
+    )
+
+
+def assemble_grades(category_counts, num_awards):
+    """Build the grade rows from (category, available, on time, makeup) counts."""
     grades = []
     available_total = 0
     solves_total = 0
@@ -40,30 +90,8 @@ def compute_grades(user_id, when=None):
     makeup_grades = []
     makeup_solves_total = 0
 
-    challenges = (
-        db.session.query(Challenges.category, db.func.count())
-        .filter(Challenges.state == "visible")
-        .filter(Challenges.value > 0)
-        .group_by(Challenges.category)
-    )
-    for category, num_available in challenges:
-        solves = (
-            Solves.query.filter_by(user_id=user_id)
-            .join(Challenges)
-            .filter(Challenges.category == category)
-        )
-
-        if when:
-            solves = solves.filter(Solves.date < when)
-
-        makeup_solves = solves
-
+    for category, num_available, num_solves, makeup_num_solves in category_counts:
         deadline = deadlines.get(category)
-        if deadline:
-            solves = solves.filter(Solves.date < deadline)
-
-        num_solves = solves.count()
-        makeup_num_solves = makeup_solves.count()
 
         available_total += num_available
         solves_total += num_solves
@@ -93,7 +121,6 @@ def compute_grades(user_id, when=None):
         next(g["grade"] for g in grades if g["category"] == "babyauto") * 0.10
     )
 
-    num_awards = Awards.query.filter_by(user_id=user_id).count()
     extra_credit = num_awards * 0.01
     grades.append(
         {
@@ -126,21 +153,344 @@ def compute_grades(user_id, when=None):
     return grades
 
 
-@grades.route("/grades", methods=["GET"])
-@authed_only
-def view_grades():
+def available_category_counts(solves):
+    """Join (category, solves, makeup_solves) counts to the available challenges."""
+    challenges = (
+        db.session.query(
+            Challenges.category,
+            db.func.count(Challenges.id),
+            solves.c.solves,
+            solves.c.makeup_solves,
+        )
+        .outerjoin(solves, solves.c.category == Challenges.category)
+        .filter(Challenges.state == "visible")
+        .filter(Challenges.value > 0)
+        .group_by(Challenges.category, solves.c.solves, solves.c.makeup_solves)
+    )
+    return [
+        (category, num_available, int(num_solves or 0), int(makeup_num_solves or 0))
+        for category, num_available, num_solves, makeup_num_solves in challenges
+    ]
+
+
+def compute_grades(user_id, when=None):
+    solves = (
+        db.session.query(
+            Challenges.category.label("category"),
+            db.func.sum(db.case([(on_time_condition(), 1)], else_=0)).label("solves"),
+            db.func.count(Solves.id).label("makeup_solves"),
+        )
+        .join(Challenges, Solves.challenge_id == Challenges.id)
+        .filter(Solves.user_id == user_id)
+    )
+    if when:
+        solves = solves.filter(Solves.date < when)
+    solves = solves.group_by(Challenges.category).subquery()
+
+    num_awards = Awards.query.filter_by(user_id=user_id).count()
+
+    return assemble_grades(available_category_counts(solves), num_awards)
+
+
+def stored_grades(user_id):
+    """Grades as of now, read from the grade_counts and award_counts tables."""
+    solves = (
+        db.session.query(
+            GradeCounts.category, GradeCounts.solves, GradeCounts.makeup_solves
+        )
+        .filter(GradeCounts.user_id == user_id)
+        .subquery()
+    )
+
+    num_awards = stored_award_count(user_id)
+
+    return assemble_grades(available_category_counts(solves), num_awards)
+
+
+def available_challenges():
+    return dict(
+        db.session.query(Challenges.category, db.func.count(Challenges.id))
+        .filter(Challenges.state == "visible")
+        .filter(Challenges.value > 0)
+        .group_by(Challenges.category)
+    )
+
+
+# Solves that commit out of id order are only picked up once the timeline expires
+SOLVE_TIMELINE_TIMEOUT = 3600
+
+
+def solve_timeline_key(user_id):
+    generation = cache.get(f"{INSTANCE}_solve_timeline_generation") or 0
+    return f"{INSTANCE}_solve_timeline_{generation}_{user_id}"
+
+
+def solve_timeline(user_id):
+    """Sorted solve dates in each category, extended with any solves since last time."""
+    key = solve_timeline_key(user_id)
+    cached_timeline = cache.get(key)
+    timeline = cached_timeline or {"last_id": 0, "categories": {}}
+
+    solves = (
+        db.session.query(Solves.id, Challenges.category, Solves.date)
+        .join(Challenges, Solves.challenge_id == Challenges.id)
+        .filter(Solves.user_id == user_id)
+        .filter(Solves.id > timeline["last_id"])
+        .order_by(Solves.id)
+        .all()
+    )
+    for solve_id, category, date in solves:
+        if date is not None:
+            bisect.insort(timeline["categories"].setdefault(category, []), date)
+        timeline["last_id"] = solve_id
+    if solves or cached_timeline is None:
+        cache.set(key, timeline, timeout=SOLVE_TIMELINE_TIMEOUT)
+
+    return timeline["categories"]
+
+
+def timeline_grades(timeline, available, num_awards, when=None):
+    category_counts = []
+    for category, num_available in available.items():
+        dates = timeline.get(category, [])
+        makeup_num_solves = bisect.bisect_left(dates, when) if when else len(dates)
+        deadline = deadlines.get(category)
+        if deadline and (not when or deadline < when):
+            num_solves = bisect.bisect_left(dates, deadline)
+        else:
+            num_solves = makeup_num_solves
+        category_counts.append((category, num_available, num_solves, makeup_num_solves))
+    return assemble_grades(category_counts, num_awards)
+
+
+def stored_award_count(user_id):
+    award_counts = AwardCounts.query.get(user_id)
+    return award_counts.awards if award_counts else 0
+
+
+def rebuild_grade_counts(session, user_ids=None):
+    """Recount the stored grade counts of user_ids, or of every user."""
+    solves = (
+        session.query(
+            Solves.user_id,
+            Challenges.category,
+            db.func.sum(db.case([(on_time_condition(), 1)], else_=0)),
+            db.func.count(Solves.id),
+        )
+        .join(Challenges, Solves.challenge_id == Challenges.id)
+        .filter(Solves.user_id != None)
+        .group_by(Solves.user_id, Challenges.category)
+    )
+    awards = (
+        session.query(Awards.user_id, db.func.count(Awards.id))
+        .filter(Awards.user_id != None)
+        .group_by(Awards.user_id)
+    )
+    grade_counts = session.query(GradeCounts)
+    award_counts = session.query(AwardCounts)
+
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        solves = solves.filter(Solves.user_id.in_(user_ids))
+        awards = awards.filter(Awards.user_id.in_(user_ids))
+        grade_counts = grade_counts.filter(GradeCounts.user_id.in_(user_ids))
+        award_counts = award_counts.filter(AwardCounts.user_id.in_(user_ids))
+
+    grade_counts.delete(synchronize_session=False)
+    award_counts.delete(synchronize_session=False)
+
+    session.bulk_insert_mappings(
+        GradeCounts,
+        [
+            {
+                "user_id": user_id,
+                "category": category,
+                "solves": int(num_solves or 0),
+                "makeup_solves": makeup_num_solves,
+            }
+            for user_id, category, num_solves, makeup_num_solves in solves
+        ],
+    )
+    session.bulk_insert_mappings(
+        AwardCounts,
+        [{"user_id": user_id, "awards": num_awards} for user_id, num_awards in awards],
+    )
+
+
+# Session.info key holding the users whose grade counts a transaction changed,
+# or None when a bulk delete could have changed anyone's
+GRADE_COUNTS_CHANGED = "pwncollege_grade_counts_changed"
+
+
+def grade_counts_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is None or target.user_id is None:
+        return
+    changed = session.info.setdefault(GRADE_COUNTS_CHANGED, set())
+    if changed is not None:
+        changed.add(target.user_id)
+
+
+def grade_counts_bulk_deleted(delete_context):
+    model = delete_context.mapper.class_
+    if issubclass(model, (Solves, Awards)) or issubclass(Solves, model):
+        delete_context.session.info[GRADE_COUNTS_CHANGED] = None
+
+
+# Recounts of the same users that commit concurrently can collide on the primary
+# key, in which case the loser recounts again on top of what the winner committed
+GRADE_COUNTS_ATTEMPTS = 3
+
+
+def update_grade_counts(session):
+    if GRADE_COUNTS_CHANGED not in session.info:
+        return
+    user_ids = session.info.pop(GRADE_COUNTS_CHANGED)
+
+    # The committed session can no longer emit SQL, so recount in a session of our own
+    for _ in range(GRADE_COUNTS_ATTEMPTS):
+        update_session = Session(bind=db.engine)
+        try:
+            rebuild_grade_counts(update_session, user_ids)
+            update_session.commit()
+            return
+        except IntegrityError as e:
+            update_session.rollback()
+            error = e
+        except Exception as e:
+            update_session.rollback()
+            error = e
+            break
+        finally:
+            update_session.close()
+
+    print(
+        f"Failed to update grade counts for {user_ids or 'all users'}: {error}",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def discard_grade_counts(session):
+    session.info.pop(GRADE_COUNTS_CHANGED, None)
+    session.info.pop(SOLVE_TIMELINES_CHANGED, None)
+
+
+# Session.info key holding the users whose solves a transaction updated or deleted,
+# or None when a bulk delete could have changed anyone's. New solves are picked up
+# by extending the cached timelines, so they are not tracked.
+SOLVE_TIMELINES_CHANGED = "pwncollege_solve_timelines_changed"
+
+
+def solve_timeline_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is None or target.user_id is None:
+        return
+    changed = session.info.setdefault(SOLVE_TIMELINES_CHANGED, set())
+    if changed is not None:
+        changed.add(target.user_id)
+
+
+def solve_timelines_bulk_deleted(delete_context):
+    model = delete_context.mapper.class_
+    if issubclass(model, Solves) or issubclass(Solves, model):
+        delete_context.session.info[SOLVE_TIMELINES_CHANGED] = None
+
+
+def forget_solve_timelines(session):
+    if SOLVE_TIMELINES_CHANGED not in session.info:
+        return
+    user_ids = session.info.pop(SOLVE_TIMELINES_CHANGED)
+
+    if user_ids is None:
+        key = f"{INSTANCE}_solve_timeline_generation"
+        cache.set(key, (cache.get(key) or 0) + 1, timeout=0)
+        return
+    for user_id in user_ids:
+        cache.delete(solve_timeline_key(user_id))
+
+
+for model in (Solves, Awards):
+    for event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, event_name, grade_counts_changed, propagate=True)
+event.listen(db.session, "after_bulk_delete", grade_counts_bulk_deleted)
+event.listen(db.session, "after_commit", update_grade_counts)
+event.listen(db.session, "after_rollback", discard_grade_counts)
+for event_name in ("after_update", "after_delete"):
+    event.listen(Solves, event_name, solve_timeline_changed, propagate=True)
+event.listen(db.session, "after_bulk_delete", solve_timelines_bulk_deleted)
+event.listen(db.session, "after_commit", forget_solve_timelines)
+
+
+def populate_grade_counts():
+    if GradeCounts.query.first() or AwardCounts.query.first():
+        return
+    if not Solves.query.first() and not Awards.query.first():
+        return
+    try:
+        rebuild_grade_counts(db.session)
+        db.session.commit()
+    except IntegrityError:
+        # Another worker booting at the same time populated them first
+        db.session.rollback()
+
+
+@click.command("rebuild-grades")
+@with_appcontext
+def rebuild_grades_command():
+    """Recount the stored grade counts of every user from Solves and Awards."""
+    rebuild_grade_counts(db.session)
+    db.session.commit()
+
+
+@click.command("check-grades")
+@with_appcontext
+def check_grades_command():
+    """Compare every user's stored grades against grades computed from scratch."""
+    mismatches = 0
+    for (user_id,) in db.session.query(Users.id).order_by(Users.id):
+        stored = stored_grades(user_id)
+        computed = compute_grades(user_id)
+        if stored == computed:
+            continue
+        mismatches += 1
+        for stored_grade, computed_grade in zip(stored, computed):
+            if stored_grade != computed_grade:
+                print(
+                    f"User {user_id}: stored {stored_grade} != computed {computed_grade}"
+                )
+    if mismatches:
+        raise click.ClickException(
+            f"{mismatches} users have stale grades, run `flask rebuild-grades`"
+        )
+
+
+def requested_user_id():
     user_id = get_current_user().id
     if request.args.get("id") and is_admin():
         try:
             user_id = int(request.args.get("id"))
         except ValueError:
             pass
+    return user_id
+
+
+@grades.route("/grades", methods=["GET"])
+@authed_only
+def view_grades():
+    user_id = requested_user_id()
 
     when = request.args.get("when")
     if when:
         when = datetime.datetime.fromtimestamp(int(when))
-
-    grades = compute_grades(user_id, when)
+        grades = timeline_grades(
+            solve_timeline(user_id),
+            available_challenges(),
+            stored_award_count(user_id),
+            when,
+        )
+    else:
+        grades = stored_grades(user_id)
 
     for grade in grades:
         grade["grade"] = f'{grade["grade"] * 100.0:.2f}%'
@@ -148,6 +498,153 @@ def view_grades():
     return render_template("grades.html", grades=grades)
 
 
+# Most points a grade curve is sampled at, the step grows to stay under it
+MAX_CURVE_POINTS = 1000
+
+
+@grades.route("/grades/curve", methods=["GET"])
+@authed_only
+def grade_curve():
+    user_id = requested_user_id()
+
+    timeline = solve_timeline(user_id)
+    available = available_challenges()
+    num_awards = stored_award_count(user_id)
+
+    now = int(datetime.datetime.now().timestamp())
+    first_solve = min((dates[0] for dates in timeline.values() if dates), default=None)
+    start = request.args.get("start", type=int)
+    if start is None:
+        start = int(first_solve.timestamp()) if first_solve else now
+    end = request.args.get("end", now, type=int)
+    step = max(request.args.get("step", 24 * 60 * 60, type=int), 1)
+    step = max(step, (end - start) // MAX_CURVE_POINTS + 1)
+
+    curve = []
+    for when in range(start, end + 1, step):
+        grades = timeline_grades(
+            timeline, available, num_awards, datetime.datetime.fromtimestamp(when)
+        )
+        curve.append(
+            {"when": when, "grades": {g["category"]: g["grade"] for g in grades}}
+        )
+
+    return jsonify({"success": True, "curve": curve})
+
+
+def class_roster(after=0, limit=None):
+    roster = (
+        db.session.query(Users.id, Users.email)
+        .filter(Users.type == "user")
+        .filter(Users.banned == False)
+        .filter(Users.hidden == False)
+        .filter(Users.id > after)
+        .order_by(Users.id)
+    )
+    if limit:
+        roster = roster.limit(limit)
+    return roster.all()
+
+
+def grade_matrix(user_ids, when=None):
+    """Grade many users at once, as one column of per-user grades for each category.
+
+    Returns the categories in due order and a dict of columns, with "extra",
+    "makeup" and "overall" columns alongside the categories. Each column is
+    indexed like user_ids and matches what compute_grades gives for that user.
+    """
+    rows = {user_id: i for i, user_id in enumerate(user_ids)}
+    num_users = len(user_ids)
+    first_id, last_id = min(user_ids, default=0), max(user_ids, default=0)
+
+    available = available_challenges()
+    max_time = datetime.datetime.max
+    categories = sorted(available, key=lambda c: (deadlines.get(c, max_time), c))
+
+    solves = {category: [0] * num_users for category in categories}
+    makeup_solves = {category: [0] * num_users for category in categories}
+    if when:
+        query = (
+            db.session.query(
+                Solves.user_id,
+                Challenges.category,
+                db.func.sum(db.case([(on_time_condition(), 1)], else_=0)),
+                db.func.count(Solves.id),
+            )
+            .join(Challenges, Solves.challenge_id == Challenges.id)
+            .filter(Challenges.category.in_(categories))
+            .filter(Solves.user_id.between(first_id, last_id))
+            .filter(Solves.date < when)
+            .group_by(Solves.user_id, Challenges.category)
+        )
+    else:
+        query = (
+            db.session.query(
+                GradeCounts.user_id,
+                GradeCounts.category,
+                GradeCounts.solves,
+                GradeCounts.makeup_solves,
+            )
+            .filter(GradeCounts.category.in_(categories))
+            .filter(GradeCounts.user_id.between(first_id, last_id))
+        )
+    for user_id, category, num_solves, makeup_num_solves in query:
+        row = rows.get(user_id)
+        if row is None:
+            continue
+        solves[category][row] = int(num_solves or 0)
+        makeup_solves[category][row] = int(makeup_num_solves or 0)
+
+    awards = [0] * num_users
+    if when:
+        query = (
+            db.session.query(Awards.user_id, db.func.count(Awards.id))
+            .filter(Awards.user_id.between(first_id, last_id))
+            .group_by(Awards.user_id)
+        )
+    else:
+        query = db.session.query(AwardCounts.user_id, AwardCounts.awards).filter(
+            AwardCounts.user_id.between(first_id, last_id)
+        )
+    for user_id, num_awards in query:
+        row = rows.get(user_id)
+        if row is not None:
+            awards[row] = num_awards
+
+    columns = {
+        category: [num_solves / available[category] for num_solves in solves[category]]
+        for category in categories
+    }
+
+    weighted_categories = [c for c in categories if c != "babyauto"]
+    makeup = [0.0] * num_users
+    weighted = [0] * num_users
+    for category in weighted_categories:
+        makeup = [
+            total + num_solves / available[category]
+            for total, num_solves in zip(makeup, makeup_solves[category])
+        ]
+        weighted = [total + grade for total, grade in zip(weighted, columns[category])]
+    if weighted_categories:
+        makeup = [total / len(weighted_categories) for total in makeup]
+        weighted = [
+            sum([makeup_grade] * len(weighted_categories), total)
+            / (2 * len(weighted_categories))
+            for total, makeup_grade in zip(weighted, makeup)
+        ]
+    else:
+        weighted = [0.0] * num_users
+
+    extra = [num_awards * 0.01 for num_awards in awards]
+    overall = [
+        grade + babyauto * 0.10 + extra_credit
+        for grade, babyauto, extra_credit in zip(weighted, columns["babyauto"], extra)
+    ]
+
+    columns.update({"extra": extra, "makeup": makeup, "overall": overall})
+    return categories, columns
+
+
 @grades.route("/grades/all", methods=["GET"])
 @admins_only
 def view_all_grades():
@@ -155,61 +652,105 @@ def view_all_grades():
     if when:
         when = datetime.datetime.fromtimestamp(int(when))
 
-    # TODO: this is the class student ids, should probably exist in a db
-    students = [1]
+    roster = class_roster()
+    categories, columns = grade_matrix([user_id for user_id, _ in roster], when)
+    keys = ["overall", "makeup", "extra", *categories]
 
-    grades = []
-    for user_id in students:
-        category_grades = compute_grades(user_id, when)
-        user = Users.query.filter_by(id=user_id).first()
-        user_grades = {
-            "email": user.email,
+    def percent(value):
+        return f"{value * 100.0:.2f}%"
+
+    grades = [
+        {
+            "email": email,
             "id": user_id,
-            "overall": [
-                e["grade"] for e in category_grades if e["category"] == "overall"
-            ][0],
-            "makeup": [
-                e["grade"] for e in category_grades if e["category"] == "makeup"
-            ][0],
-            "extra": [e["grade"] for e in category_grades if e["category"] == "extra"][
-                0
-            ],
+            **{key: columns[key][row] for key in keys},
         }
-        for category_grade in category_grades:
-            category = category_grade["category"]
-            grade = category_grade["grade"]
-            user_grades[category] = grade
-        grades.append(user_grades)
-
+        for row, (user_id, email) in enumerate(roster)
+    ]
     grades.sort(key=lambda k: (k["overall"], k["id"]), reverse=True)
+    for user_grades in grades:
+        for key in keys:
+            user_grades[key] = percent(user_grades[key])
 
-    statistics = []
+    statistics = [
+        {
+            "email": "average",
+            "id": "",
+            **{key: percent(average(columns[key])) for key in keys},
+        }
+    ]
 
-    average_grades = {"email": "average", "id": ""}
-    for key in user_grades:
-        if key not in average_grades:
-            average_grades[key] = []
-    for user_grades in grades:
-        for key, value in user_grades.items():
-            if key in ["email", "id"]:
-                continue
-            average_grades[key].append(value)
-    for key, value in average_grades.items():
-        if key in ["email", "id"]:
-            continue
-        average_grades[key] = average(value)
-    statistics.append(average_grades)
+    return render_template("all_grades.html", grades=grades, statistics=statistics)
 
-    for user_grades in grades:
-        for key, value in user_grades.items():
-            if key in ["email", "id"]:
-                continue
-            user_grades[key] = f"{value * 100.0:.2f}%"
 
-    for statistic in statistics:
-        for key, value in statistic.items():
-            if key in ["email", "id"]:
-                continue
-            statistic[key] = f"{value * 100.0:.2f}%"
+# Students graded per grade_matrix call while exporting, which bounds memory use
+EXPORT_CHUNK_SIZE = 500
 
-    return render_template("all_grades.html", grades=grades, statistics=statistics)
+
+@grades.route("/grades/export", methods=["GET"])
+@admins_only
+def export_grades():
+    when = request.args.get("when")
+    if when:
+        when = datetime.datetime.fromtimestamp(int(when))
+
+    format = request.args.get("format", "csv")
+    if format not in ("csv", "jsonl"):
+        abort(400)
+
+    max_time = datetime.datetime.max
+    categories = sorted(
+        available_challenges(), key=lambda c: (deadlines.get(c, max_time), c)
+    )
+    keys = ["overall", "makeup", "extra", *categories]
+
+    def graded_students():
+        last_id = 0
+        while True:
+            roster = class_roster(after=last_id, limit=EXPORT_CHUNK_SIZE)
+            if not roster:
+                return
+            _, columns = grade_matrix([user_id for user_id, _ in roster], when)
+            # Challenges may change mid-export, the header's categories are kept
+            key_columns = [(key, columns.get(key)) for key in keys]
+            for row, (user_id, email) in enumerate(roster):
+                yield {
+                    "id": user_id,
+                    "email": email,
+                    **{
+                        key: column[row] if column else 0.0
+                        for key, column in key_columns
+                    },
+                }
+            last_id = roster[-1][0]
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, ["id", "email", *keys])
+
+        def flush():
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return value
+
+        writer.writeheader()
+        yield flush()
+        for student in graded_students():
+            writer.writerow(student)
+            yield flush()
+
+    def generate_jsonl():
+        for student in graded_students():
+            yield json.dumps(student) + "\n"
+
+    if format == "csv":
+        generate, mimetype = generate_csv, "text/csv"
+    else:
+        generate, mimetype = generate_jsonl, "application/x-ndjson"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=grades.{format}"},
+    )
@@ -0,0 +1,132 @@
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+from flask_restx import Namespace, Resource
+from CTFd.models import db
+from CTFd.cache import cache
+from CTFd.utils.decorators import admins_only
+
+from .settings import INSTANCE, IMAGE_CATALOG_INTERVAL
+from .docker_hosts import docker_hosts, host_client
+from .docker_challenge import DockerChallenges
+
+
+def catalog_key():
+    return f"{INSTANCE}_image_catalog"
+
+
+def get_image_catalog():
+    return cache.get(catalog_key()) or {}
+
+
+def challenge_images():
+    images = db.session.query(DockerChallenges.docker_image_name).distinct()
+    return sorted(image_name for (image_name,) in images if image_name)
+
+
+def prepare_image(host, image_name, previous=None):
+    docker_client = host_client(host)
+    entry = dict(previous or {}, host=host, image=image_name, error=None)
+
+    try:
+        image = docker_client.images.get(image_name)
+    except docker.errors.ImageNotFound:
+        repository, tag = docker.utils.parse_repository_tag(image_name)
+        image = docker_client.images.pull(repository, tag=tag or "latest")
+        entry["pulled_at"] = time.time()
+
+    entry["id"] = image.id
+    entry["digest"] = (image.attrs.get("RepoDigests") or [image.id])[0]
+    entry["size"] = image.attrs["Size"]
+
+    # Running the image once reads its layers into the page cache
+    if (previous or {}).get("warmed_id") != image.id:
+        docker_client.containers.run(
+            image_name, ["/bin/true"], network="none", remove=True
+        )
+        entry["warmed_id"] = image.id
+        entry["warmed_at"] = time.time()
+
+    return entry
+
+
+def refresh_image_catalog(executor):
+    catalog = get_image_catalog()
+
+    def prepare(key):
+        host, image_name = key
+        try:
+            return prepare_image(host, image_name, catalog.get(key))
+        except Exception as e:
+            print(
+                f"Failed to prepare image {image_name} on {host or 'local'}: {e}",
+                file=sys.stderr,
+                flush=True,
+            )
+            return dict(catalog.get(key, {}), host=host, image=image_name, error=str(e))
+
+    keys = [(host, image) for host in docker_hosts() for image in challenge_images()]
+    catalog = dict(zip(keys, executor.map(prepare, keys)))
+    cache.set(catalog_key(), catalog, timeout=0)
+    return catalog
+
+
+def image_catalog_summary():
+    summary = []
+    for entry in get_image_catalog().values():
+        summary.append(
+            {
+                **entry,
+                "hot": not entry.get("error")
+                and entry.get("warmed_id") == entry.get("id"),
+            }
+        )
+    return summary
+
+
+def image_catalog_loop(app):
+    lock_key = f"{INSTANCE}_image_catalog_lock"
+    refreshed_key = f"{INSTANCE}_image_catalog_refreshed"
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        while True:
+            with app.app_context():
+                # Every web worker runs this loop, only one of them refreshes per
+                # interval, and the lock is only held while it is refreshing
+                if not cache.get(refreshed_key) and cache.add(
+                    lock_key, True, timeout=IMAGE_CATALOG_INTERVAL
+                ):
+                    try:
+                        refresh_image_catalog(executor)
+                        cache.set(refreshed_key, True, timeout=IMAGE_CATALOG_INTERVAL)
+                    except Exception as e:
+                        print(
+                            f"Failed to refresh image catalog: {e}",
+                            file=sys.stderr,
+                            flush=True,
+                        )
+                    finally:
+                        cache.delete(lock_key)
+                        db.session.remove()
+            time.sleep(IMAGE_CATALOG_INTERVAL)
+
+
+def start_image_catalog(app):
+    if not IMAGE_CATALOG_INTERVAL:
+        return
+    thread = threading.Thread(target=image_catalog_loop, args=(app,), daemon=True)
+    thread.start()
+
+
+image_catalog_namespace = Namespace(
+    "images", description="Endpoint to manage docker challenge images"
+)
+
+
+@image_catalog_namespace.route("")
+class ImageCatalog(Resource):
+    @admins_only
+    def get(self):
+        return {"success": True, "images": image_catalog_summary()}
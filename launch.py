@@ -0,0 +1,338 @@
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+import requests
+from CTFd.cache import cache
+
+from .settings import INSTANCE, LAUNCH_WORKERS, LAUNCH_QUEUE_SIZE, LAUNCH_TIMEOUT
+from .utils import serialize_user_flag
+from .containers import (
+    user_container_name,
+    run_user_container,
+    check_home_mount,
+    kill_container,
+    set_container_launch,
+    get_container_launch,
+)
+from .docker_hosts import host_client, user_host, set_user_host, place_container
+from .container_pool import claim_standby, refill_standby
+from .lifecycle import touch_container
+from .container_index import container_index
+from .provision import build_provision, challenge_files, flag_file, practice_mode
+from .metrics import LaunchTimer, launch_metrics
+from .admission import end_launch
+
+
+# Directories that are expected to change when a container is reset
+RESET_CHANGES = {"/", "/tmp", "/var", "/var/tmp"}
+
+
+def reset_container(container, artifact):
+    # A solved challenge may have given the user root, and with SYS_PTRACE root can
+    # hide in any process that survives, including the init loop, so the reset
+    # restarts the container instead of only killing the user's processes
+    try:
+        container.restart(timeout=0)
+        container.reload()
+    except docker.errors.APIError:
+        return False
+    if container.status != "running":
+        return False
+
+    exit_code, _ = container.exec_run(
+        [
+            "/bin/sh",
+            "-c",
+            'rm -rf "$1" /flag /tmp/* /tmp/.[!.]* /var/tmp/*',
+            "reset",
+            artifact,
+        ]
+    )
+    if exit_code != 0:
+        return False
+
+    # Anything else in the container layer may have been left behind by a solved
+    # challenge (for instance a suid shell), so only a clean container is reused
+    changes = container.diff() or []
+    return all(
+        change["Kind"] == 0 and change["Path"] in RESET_CHANGES for change in changes
+    )
+
+
+def reuse_container(docker_client, user_id, image_name, hostname):
+    previous = get_container_launch(user_id)
+    if not previous.get("reusable") or previous.get("image_name") != image_name:
+        return None
+
+    try:
+        container = docker_client.containers.get(user_container_name(user_id))
+    except docker.errors.NotFound:
+        return None
+
+    if container.id != previous.get("container_id") or container.status != "running":
+        return None
+
+    # The hostname names the challenge and is fixed when the container is created
+    if container.attrs["Config"]["Hostname"] != hostname:
+        return None
+
+    if not reset_container(container, previous["artifact"]):
+        return None
+
+    return container
+
+
+def launch_container(**launch):
+    timer = LaunchTimer()
+    outcome = "error"
+    try:
+        result = run_launch(timer, **launch)
+        outcome = "success" if result["success"] else result["error"]
+        return result
+    finally:
+        launch_metrics.record(
+            timer,
+            user_id=launch["user_id"],
+            image_name=launch["image_name"],
+            category=launch["category"],
+            outcome=outcome,
+        )
+
+
+def run_launch(
+    timer,
+    *,
+    user_id,
+    account_id,
+    challenge_id,
+    image_name,
+    category,
+    challenge,
+    practice=False,
+    selected_path=None,
+    chall_path=None,
+):
+    container_name = user_container_name(user_id)
+    hostname = f"{category}_{challenge}"
+
+    container = None
+    reused = False
+
+    host = user_host(user_id)
+    if host is not None:
+        docker_client = host_client(host)
+
+        try:
+            with timer.phase("reuse"):
+                container = reuse_container(
+                    docker_client, user_id, image_name, hostname
+                )
+            reused = container is not None
+
+            if not container:
+                with timer.phase("claim"):
+                    container = claim_standby(
+                        docker_client, user_id, image_name, hostname
+                    )
+
+            if not container:
+                with timer.phase("kill"):
+                    try:
+                        kill_container(docker_client.containers.get(container_name))
+                    except docker.errors.NotFound:
+                        pass
+
+        except requests.exceptions.ConnectionError as e:
+            print(f"Docker host {host} unreachable: {e}", file=sys.stderr, flush=True)
+
+    if not container:
+        with timer.phase("place"):
+            host = place_container()
+        if host is None:
+            return {"success": False, "error": "No docker host available"}
+
+        docker_client = host_client(host)
+        set_user_host(user_id, host)
+
+        # try:
+        #     response = requests.post(f"http://home_daemon/init/{user_id}").json()
+        #     if not response["success"]:
+        #         error = response["error"]
+        #         print(
+        #             f"Home daemon failed to init home for user {user_id}: {error}",
+        #             file=sys.stderr,
+        #             flush=True,
+        #         )
+        #         return {"success": False, "error": "Home daemon failed to init home"}
+        # except Exception as e:
+        #     print(f"Failed to reach home daemon: {e}", file=sys.stderr, flush=True)
+        #     return {"success": False, "error": "Failed to reach home daemon"}
+
+        try:
+            with timer.phase("run"):
+                container = run_user_container(
+                    docker_client,
+                    image_name,
+                    user_id,
+                    name=container_name,
+                    hostname=hostname,
+                    environment={"CHALLENGE_ID": str(challenge_id)},
+                )
+        except Exception as e:
+            print(f"Docker failed: {e}", file=sys.stderr, flush=True)
+            return {"success": False, "error": "Docker failed"}
+
+        with timer.phase("mount_check"):
+            error = check_home_mount(container)
+        if error:
+            kill_container(container)
+            print(f"{error} for user {user_id}", file=sys.stderr, flush=True)
+            return {"success": False, "error": error}
+
+    extra_data = None
+    stages = []
+
+    if category == "babysuid":
+        # TODO: make babysuid not so hacked in
+
+        # No command injection please
+        selected_path = selected_path.replace("'", "").replace('"', "")
+
+        with timer.phase("selected_path"):
+            exit_code, output = container.exec_run(
+                f"""/bin/sh -c \"
+                test -f '{selected_path}' &&
+                chmod 4755 '{selected_path}' &&
+                readlink -e '{selected_path}';
+                \""""
+            )
+
+        if exit_code != 0:
+            kill_container(container)
+            return {"success": False, "error": "Invalid path"}
+
+        selected_path = output.decode("latin").strip()
+
+        extra_data = selected_path
+
+    else:
+        stages.append(challenge_files(chall_path, f"{category}_{challenge}"))
+
+    if not practice:
+        flag = serialize_user_flag(account_id, challenge_id, extra_data)
+
+    else:
+        flag = serialize_user_flag(0, 0, 0)
+        stages.append(practice_mode())
+
+    stages.append(flag_file(f"pwn_college{{{flag}}}"))
+
+    with timer.phase("archive"):
+        provision = build_provision(stages)
+
+    with timer.phase("provision"):
+        provisioned = provision.apply(container)
+
+    if not provisioned:
+        kill_container(container)
+        print(f"Provisioning failed for user {user_id}", file=sys.stderr, flush=True)
+        return {"success": False, "error": "Provisioning failed"}
+
+    # Practice mode grants root, and babysuid leaves suid bits behind
+    reusable = not practice and category != "babysuid"
+
+    set_container_launch(
+        user_id,
+        container_id=container.id,
+        challenge_id=challenge_id,
+        image_name=image_name,
+        artifact=f"/{category}_{challenge}",
+        reusable=reusable,
+    )
+    container_index.update(
+        user_id,
+        container_id=container.id,
+        challenge_id=challenge_id,
+        state="running",
+        host=host,
+    )
+    touch_container(user_id)
+    # A reusable container is reset in place when this challenge is launched again,
+    # so a standby would only sit idle next to it
+    if not reused and not reusable:
+        refill_standby(user_id, image_name, hostname, host)
+
+    return {"success": True, "ssh": f"ssh {INSTANCE}@{INSTANCE}.pwn.college"}
+
+
+launch_executor = ThreadPoolExecutor(max_workers=max(LAUNCH_WORKERS, 1))
+launch_slots = threading.BoundedSemaphore(LAUNCH_QUEUE_SIZE)
+
+
+def launch_job_key(job_id):
+    return f"{INSTANCE}_launch_job_{job_id}"
+
+
+def set_launch_job(job_id, user_id, status, *, deadline, **details):
+    cache.set(
+        launch_job_key(job_id),
+        {"user_id": user_id, "status": status, "deadline": deadline, **details},
+        timeout=60 * 60,
+    )
+
+
+def get_launch_job(job_id):
+    job = cache.get(launch_job_key(job_id))
+
+    # A worker that dies mid-launch never finishes its job, so stop waiting on it
+    if (
+        job
+        and job["status"] in ("queued", "starting")
+        and time.time() > job["deadline"]
+    ):
+        job = {**job, "status": "failed", "error": "Launch timed out"}
+
+    return job
+
+
+def submit_launch(app, job_id, **launch):
+    if not launch_slots.acquire(blocking=False):
+        return False
+
+    deadline = time.time() + LAUNCH_TIMEOUT
+    set_launch_job(job_id, launch["user_id"], "queued", deadline=deadline)
+    launch_executor.submit(run_launch_job, app, job_id, deadline, launch)
+    return True
+
+
+def run_launch_job(app, job_id, deadline, launch):
+    user_id = launch["user_id"]
+    try:
+        with app.app_context():
+            set_launch_job(job_id, user_id, "starting", deadline=deadline)
+            try:
+                result = launch_container(**launch)
+            except Exception as e:
+                print(
+                    f"Launch job {job_id} failed for user {user_id}: {e}",
+                    file=sys.stderr,
+                    flush=True,
+                )
+                result = {"success": False, "error": "Docker failed"}
+
+            finally:
+                end_launch(user_id)
+
+            if result["success"]:
+                set_launch_job(
+                    job_id, user_id, "ready", deadline=deadline, ssh=result["ssh"]
+                )
+            else:
+                set_launch_job(
+                    job_id, user_id, "failed", deadline=deadline, error=result["error"]
+                )
+    finally:
+        launch_slots.release()
@@ -0,0 +1,171 @@
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import docker
+from CTFd.cache import cache
+
+from .settings import INSTANCE, CONTAINER_IDLE_TTL, LIFECYCLE_INTERVAL
+from .containers import CONTAINER_MEMORY, user_container_name, kill_container
+from .docker_hosts import docker_hosts, host_client
+from .container_pool import standby_container_name
+
+
+# CPU time (in nanoseconds) a container may use per interval and still be idle
+IDLE_CPU_USAGE = 10**7
+
+# Containers whose CPU usage is sampled at once on each host
+STATS_WORKERS = 16
+
+
+def touch_container(user_id, when=None):
+    cache.set(f"{user_container_name(user_id)}_active", when or time.time(), timeout=0)
+
+
+def container_cpu_usage(container):
+    try:
+        stats = container.stats(stream=False)
+    except docker.errors.NotFound:
+        return None
+    return stats["cpu_stats"]["cpu_usage"]["total_usage"]
+
+
+def container_active_at(container, user_id, now, cpu_usage):
+    cpu_key = f"{container.name}_{container.id}_cpu"
+    previous_cpu_usage = cache.get(cpu_key)
+    cache.set(cpu_key, cpu_usage, timeout=max(CONTAINER_IDLE_TTL * 2, 3600))
+
+    if previous_cpu_usage is None or cpu_usage - previous_cpu_usage > IDLE_CPU_USAGE:
+        touch_container(user_id, now)
+        return now
+
+    return cache.get(f"{user_container_name(user_id)}_active") or now
+
+
+def user_containers(docker_client):
+    prefix = f"{INSTANCE}_user_"
+    for container in docker_client.containers.list(filters={"name": prefix}):
+        if not container.name.startswith(prefix):
+            continue
+        try:
+            user_id = int(container.name[len(prefix) :])
+        except ValueError:
+            continue
+        yield user_id, container
+
+
+def reap_idle_containers(host):
+    docker_client = host_client(host)
+    now = time.time()
+
+    # A stats sample makes the daemon wait for two CPU readings, so containers with
+    # recent launch, exec or terminal activity are not sampled at all, and the rest
+    # are sampled concurrently
+    candidates = [
+        (user_id, container)
+        for user_id, container in user_containers(docker_client)
+        if now - (cache.get(f"{user_container_name(user_id)}_active") or 0)
+        >= CONTAINER_IDLE_TTL
+    ]
+    with ThreadPoolExecutor(max_workers=STATS_WORKERS) as executor:
+        cpu_usages = list(
+            executor.map(
+                lambda candidate: container_cpu_usage(candidate[1]), candidates
+            )
+        )
+
+    for (user_id, container), cpu_usage in zip(candidates, cpu_usages):
+        if cpu_usage is None:
+            continue
+
+        active_at = container_active_at(container, user_id, now, cpu_usage)
+        if now - active_at < CONTAINER_IDLE_TTL:
+            continue
+
+        print(
+            f"Stopping idle container for user {user_id} "
+            f"(idle {int(now - active_at)}s)",
+            file=sys.stderr,
+            flush=True,
+        )
+        kill_container(container)
+        try:
+            kill_container(
+                docker_client.containers.get(standby_container_name(user_id))
+            )
+        except docker.errors.NotFound:
+            pass
+
+
+def capacity_summary():
+    summary = []
+    for host in docker_hosts():
+        try:
+            docker_client = host_client(host)
+            containers = docker_client.containers.list(
+                filters={"name": f"{INSTANCE}_"}, sparse=True
+            )
+            total_memory = docker_client.info()["MemTotal"]
+        except Exception as e:
+            summary.append({"host": host, "available": False, "error": str(e)})
+            continue
+
+        names = [container.attrs["Names"][0].lstrip("/") for container in containers]
+        committed_memory = len(containers) * CONTAINER_MEMORY
+        summary.append(
+            {
+                "host": host,
+                "available": True,
+                "user_containers": sum(
+                    name.startswith(f"{INSTANCE}_user_") for name in names
+                ),
+                "standby_containers": sum(
+                    name.startswith(f"{INSTANCE}_standby_") for name in names
+                ),
+                "containers": len(containers),
+                "committed_memory": committed_memory,
+                "total_memory": total_memory,
+                "free_memory": max(total_memory - committed_memory, 0),
+            }
+        )
+    return summary
+
+
+def lifecycle_loop(app):
+    def reap(host):
+        with app.app_context():
+            try:
+                reap_idle_containers(host)
+            except Exception as e:
+                print(
+                    f"Failed to reap containers on {host}: {e}",
+                    file=sys.stderr,
+                    flush=True,
+                )
+
+    lock_key = f"{INSTANCE}_lifecycle_lock"
+    with ThreadPoolExecutor(max_workers=len(docker_hosts())) as executor:
+        while True:
+            time.sleep(LIFECYCLE_INTERVAL)
+
+            with app.app_context():
+                # Every web worker runs this loop, only one of them reaps per interval
+                if not cache.add(lock_key, True, timeout=LIFECYCLE_INTERVAL):
+                    continue
+
+            # A pass can outlast the interval, so the lock is renewed until it ends
+            pending = [executor.submit(reap, host) for host in docker_hosts()]
+            while True:
+                _, pending = wait(pending, timeout=LIFECYCLE_INTERVAL / 2)
+                if not pending:
+                    break
+                with app.app_context():
+                    cache.set(lock_key, True, timeout=LIFECYCLE_INTERVAL)
+
+
+def start_lifecycle_manager(app):
+    if not CONTAINER_IDLE_TTL:
+        return
+    thread = threading.Thread(target=lifecycle_loop, args=(app,), daemon=True)
+    thread.start()
@@ -0,0 +1,169 @@
+import sys
+import time
+import bisect
+import hashlib
+import contextlib
+import collections
+
+from flask import Response
+from flask_restx import Namespace, Resource
+from CTFd.cache import cache
+from CTFd.utils.decorators import admins_only
+
+from .settings import INSTANCE, LAUNCH_SLOW_THRESHOLD
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SUM_SCALE = 10**6
+
+
+class Histogram:
+    """Latency histogram whose counters live in the cache, shared by every web worker."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def counter_keys(self):
+        return [
+            *(f"{self.key}_bucket_{i}" for i in range(len(LATENCY_BUCKETS) + 1)),
+            f"{self.key}_sum",
+            f"{self.key}_count",
+        ]
+
+    def observe(self, value):
+        cache.inc(f"{self.key}_bucket_{bisect.bisect_left(LATENCY_BUCKETS, value)}")
+        # Cache counters are integers, so the sum is kept in microseconds
+        cache.inc(f"{self.key}_sum", int(value * SUM_SCALE))
+        cache.inc(f"{self.key}_count")
+
+    def exposition(self, name, labels):
+        *counts, total, count = (
+            value or 0 for value in cache.get_many(*self.counter_keys())
+        )
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*LATENCY_BUCKETS, "+Inf"), counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {total / SUM_SCALE}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+        return lines
+
+
+class LaunchTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+class LaunchMetrics:
+    """Latency histograms of container launches, per phase and per challenge image.
+
+    Every histogram is registered once in the cache under an increasing index, so
+    any web worker can list and report all of them.
+    """
+
+    def __init__(self):
+        self.registered = set()
+
+    def histogram(self, *series):
+        digest = hashlib.sha1(repr(series).encode()).hexdigest()
+        key = f"{INSTANCE}_launch_metrics_{digest}"
+        if key not in self.registered:
+            if cache.add(f"{key}_series", series, timeout=0):
+                for counter_key in Histogram(key).counter_keys():
+                    cache.add(counter_key, 0, timeout=0)
+                index = cache.inc(f"{INSTANCE}_launch_metrics_series")
+                cache.set(f"{INSTANCE}_launch_metrics_series_{index}", key, timeout=0)
+            self.registered.add(key)
+        return Histogram(key)
+
+    def record(self, timer, *, user_id, image_name, category, outcome):
+        total = timer.total()
+
+        for phase, seconds in timer.phases.items():
+            self.histogram("phase", phase, outcome).observe(seconds)
+        self.histogram("launch", str(image_name), str(category), outcome).observe(total)
+
+        if LAUNCH_SLOW_THRESHOLD and total >= LAUNCH_SLOW_THRESHOLD:
+            breakdown = ", ".join(
+                f"{phase}={seconds:.3f}s" for phase, seconds in timer.phases.items()
+            )
+            print(
+                f"Slow launch for user {user_id} ({image_name}, {category}, {outcome}): "
+                f"{total:.3f}s [{breakdown}]",
+                file=sys.stderr,
+                flush=True,
+            )
+
+    def registered_histograms(self):
+        num_series = cache.get(f"{INSTANCE}_launch_metrics_series") or 0
+        keys = cache.get_many(
+            *(
+                f"{INSTANCE}_launch_metrics_series_{index}"
+                for index in range(1, num_series + 1)
+            )
+        )
+        keys = [key for key in keys if key]
+        series = cache.get_many(*(f"{key}_series" for key in keys))
+        return sorted(
+            (series, Histogram(key)) for key, series in zip(keys, series) if series
+        )
+
+    def exposition(self):
+        def label(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+        histograms = self.registered_histograms()
+
+        lines = [
+            "# TYPE pwncollege_launch_phase_seconds histogram",
+        ]
+        for (kind, *series), histogram in histograms:
+            if kind != "phase":
+                continue
+            phase, outcome = series
+            lines.extend(
+                histogram.exposition(
+                    "pwncollege_launch_phase_seconds",
+                    f'phase="{label(phase)}",outcome="{label(outcome)}"',
+                )
+            )
+        lines.append("# TYPE pwncollege_launch_seconds histogram")
+        for (kind, *series), histogram in histograms:
+            if kind != "launch":
+                continue
+            image_name, category, outcome = series
+            lines.extend(
+                histogram.exposition(
+                    "pwncollege_launch_seconds",
+                    f'image="{label(image_name)}",category="{label(category)}",'
+                    f'outcome="{label(outcome)}"',
+                )
+            )
+        return "\n".join(lines) + "\n"
+
+
+launch_metrics = LaunchMetrics()
+
+
+metrics_namespace = Namespace("metrics", description="Endpoint to expose metrics")
+
+
+@metrics_namespace.route("")
+class Metrics(Resource):
+    @admins_only
+    def get(self):
+        return Response(launch_metrics.exposition(), mimetype="text/plain")
@@ -0,0 +1,85 @@
+import io
+import tarfile
+
+from .tar_cache import tar_cache
+
+
+class Provision:
+    """Collects every setup step for a container into one archive and one shell script.
+
+    Stages are callables that take a `Provision` and declare what they need
+    through `add_path`, `add_file`, and `add_command`. Applying the provision
+    costs one `put_archive`, plus one exec only if some stage declared a command.
+    """
+
+    def __init__(self):
+        self.segments = []
+        self.commands = []
+
+    def add_path(self, path, arcname, *, mode=None):
+        self.segments.append(tar_cache.get(path, arcname, mode=mode))
+
+    def add_file(self, arcname, data, *, mode=0o644, uid=0, gid=0):
+        if isinstance(data, str):
+            data = data.encode()
+        tarinfo = tarfile.TarInfo(arcname)
+        tarinfo.size = len(data)
+        tarinfo.mode = mode
+        tarinfo.uid = uid
+        tarinfo.gid = gid
+        f = io.BytesIO()
+        t = tarfile.open(mode="w", fileobj=f)
+        t.addfile(tarinfo, io.BytesIO(data))
+        self.segments.append(f.getvalue())
+
+    def add_command(self, command):
+        self.commands.append(command)
+
+    def archive(self):
+        end_of_archive = tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+        return b"".join([*self.segments, end_of_archive])
+
+    def apply(self, container):
+        if not container.put_archive("/", self.archive()):
+            return False
+
+        if self.commands:
+            script = "\n".join(self.commands)
+            exit_code, _ = container.exec_run(["/bin/sh", "-c", script])
+            if exit_code != 0:
+                return False
+
+        return True
+
+
+def build_provision(stages):
+    provision = Provision()
+    for stage in stages:
+        stage(provision)
+    return provision
+
+
+def challenge_files(path, name):
+    def stage(provision):
+        provision.add_path(path, name, mode=0o4755)
+
+    return stage
+
+
+def flag_file(flag):
+    def stage(provision):
+        provision.add_file("flag", f"{flag}\n", mode=0o400)
+
+    return stage
+
+
+def practice_mode():
+    def stage(provision):
+        provision.add_command("chmod 4755 /usr/bin/sudo")
+        provision.add_command("adduser ctf sudo")
+        provision.add_command("echo 'ctf ALL=(ALL) NOPASSWD:ALL' >> /etc/sudoers")
+        provision.add_command('echo "127.0.0.1\t$(hostname)" >> /etc/hosts')
+        # The exit status of the script verifies the whole provision
+        provision.add_command("test -s /flag")
+
+    return stage
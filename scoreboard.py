@@ -1,9 +1,12 @@
+import time
+import bisect
+import threading
 import collections
 
 from flask import render_template
 from CTFd.models import db, Solves, Challenges
-from CTFd.cache import cache, make_cache_key
 from CTFd.utils import config, get_config
+from CTFd.utils.dates import unix_time_to_utc
 from CTFd.utils.helpers import get_infos
 from CTFd.utils.scores import get_standings
 from CTFd.utils.user import is_admin
@@ -11,6 +14,8 @@ from CTFd.utils.modes import get_model
 from CTFd.utils.config.visibility import scores_visible
 from CTFd.utils.decorators.visibility import check_score_visibility
 
+from .settings import SCOREBOARD_REBUILD_INTERVAL
+
 
 def email_group_asset(email):
     if email.endswith("@asu.edu"):
@@ -22,49 +27,134 @@ def email_group_asset(email):
     return f"plugins/CTFd-pwn-college-plugin/assets/scoreboard/{group}"
 
 
-def get_category_standings(admin=False):
-    Model = get_model()
-
-    scores = (
-        Solves.query.join(Challenges, Challenges.id == Solves.challenge_id)
-        .filter(Challenges.state == "visible")
-        .join(Model, Model.id == Solves.account_id)
-        .filter(Model.hidden == False)
-    )
-
-    freeze = get_config("freeze")
-    if not admin and freeze:
-        scores = scores.filter(Solves.date < unix_time_to_utc(freeze))
-
-    scores = scores.group_by(Challenges.category, Solves.account_id).with_entities(
-        Challenges.category,
-        Solves.account_id,
-        Model.name,
-        Model.email,
-        db.func.count(),
-        db.func.max(Solves.date),
-    )
-
-    result = collections.defaultdict(list)
-    for category, account_id, name, email, count, date in scores:
-        result[category].append(
-            {
-                "account_id": account_id,
-                "name": name,
-                "email": email,
-                "score": count,
-                "date": date,
-            }
+class CategoryBoard:
+    """Accounts of each category kept sorted by (-score, last solve date)."""
+
+    def __init__(self, cutoff=None):
+        self.cutoff = cutoff
+        self.entries = collections.defaultdict(dict)
+        self.ranks = collections.defaultdict(list)
+
+    def set(self, category, account_id, score, date):
+        entries, ranks = self.entries[category], self.ranks[category]
+        if account_id in entries:
+            old_score, old_date = entries[account_id]
+            del ranks[bisect.bisect_left(ranks, (-old_score, old_date, account_id))]
+        entries[account_id] = score, date
+        bisect.insort(ranks, (-score, date, account_id))
+
+    def solve(self, category, account_id, date):
+        if self.cutoff and date >= self.cutoff:
+            return
+        score, last_date = self.entries[category].get(account_id, (0, date))
+        self.set(category, account_id, score + 1, max(date, last_date))
+
+    def standings(self, accounts):
+        return {
+            category: [
+                {
+                    "account_id": account_id,
+                    "name": accounts[account_id][0],
+                    "email": accounts[account_id][1],
+                    "score": -negative_score,
+                    "date": date,
+                }
+                for negative_score, date, account_id in ranks
+            ]
+            for category, ranks in self.ranks.items()
+        }
+
+
+class CategoryStandings:
+    """Per-category standings, extended with new solves and rebuilt periodically."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = None
+        self.built_at = 0
+
+    def scores(self, Model):
+        return (
+            Solves.query.join(Challenges, Challenges.id == Solves.challenge_id)
+            .filter(Challenges.state == "visible")
+            .join(Model, Model.id == Solves.account_id)
+            .filter(Model.hidden == False)
         )
 
-    for ranks in result.values():
-        ranks.sort(key=lambda k: (-1 * k["score"], k["date"]))
+    def rebuild(self, Model, freeze):
+        self.live = CategoryBoard()
+        self.frozen = CategoryBoard(unix_time_to_utc(freeze) if freeze else None)
+        self.accounts = {}
+        self.last_id = db.session.query(db.func.max(Solves.id)).scalar() or 0
+
+        scores = self.scores(Model).filter(Solves.id <= self.last_id)
+        for board in (self.live, self.frozen):
+            board_scores = scores
+            if board.cutoff:
+                board_scores = board_scores.filter(Solves.date < board.cutoff)
+            board_scores = board_scores.group_by(
+                Challenges.category, Solves.account_id, Model.name, Model.email
+            ).with_entities(
+                Challenges.category,
+                Solves.account_id,
+                Model.name,
+                Model.email,
+                db.func.count(),
+                db.func.max(Solves.date),
+            )
+            for category, account_id, name, email, count, date in board_scores:
+                self.accounts[account_id] = name, email
+                board.set(category, account_id, count, date)
+
+        self.built = (Model, freeze)
+        self.built_at = time.time()
+
+    def sync(self):
+        Model = get_model()
+        freeze = get_config("freeze")
+
+        with self.lock:
+            if (
+                self.built != (Model, freeze)
+                or time.time() - self.built_at > SCOREBOARD_REBUILD_INTERVAL
+            ):
+                self.rebuild(Model, freeze)
+                return
+
+            solves = (
+                self.scores(Model)
+                .filter(Solves.id > self.last_id)
+                .with_entities(
+                    Solves.id,
+                    Challenges.category,
+                    Solves.account_id,
+                    Model.name,
+                    Model.email,
+                    Solves.date,
+                )
+                .order_by(Solves.id)
+            )
+            for solve_id, category, account_id, name, email, date in solves:
+                self.accounts[account_id] = name, email
+                self.live.solve(category, account_id, date)
+                self.frozen.solve(category, account_id, date)
+                self.last_id = solve_id
+
+    def standings(self, admin=False):
+        self.sync()
+        with self.lock:
+            board = self.live if admin else self.frozen
+            return board.standings(self.accounts)
+
+
+category_standings = CategoryStandings()
 
-    return result
+
+def get_category_standings(admin=False):
+    return category_standings.standings(admin)
 
 
 @check_score_visibility
-@cache.cached(timeout=60, key_prefix=make_cache_key)
 def scoreboard_listing():
     infos = get_infos()
 
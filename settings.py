@@ -4,6 +4,7 @@ import sys
 INSTANCE = os.getenv("PWN_COLLEGE_INSTANCE")
 HOST_DATA_PATH = os.getenv("HOST_DATA_PATH")
 BINARY_NINJA_API_KEY = os.getenv("BINARY_NINJA_API_KEY")
+CHALLENGES_PATH = os.getenv("CHALLENGES_PATH", "/challenges")
 
 if not INSTANCE:
     raise RuntimeError(
@@ -20,3 +21,50 @@ if not BINARY_NINJA_API_KEY:
         "Configuration Warning: BINARY_NINJA_API_KEY is not set in the environment",
         file=sys.stderr,
     )
+
+CONTAINER_POOL_SIZE = int(os.getenv("CONTAINER_POOL_SIZE", "0"))
+CONTAINER_POOL_SIZES = {
+    image_name: int(size)
+    for image_name, _, size in (
+        entry.partition("=")
+        for entry in os.getenv("CONTAINER_POOL_SIZES", "").split(",")
+        if entry
+    )
+}
+
+# Every web worker has its own tar cache, held in memory unless TAR_CACHE_PATH is set
+TAR_CACHE_SIZE = int(os.getenv("TAR_CACHE_SIZE", str(32 * 1024 * 1024)))
+TAR_CACHE_PATH = os.getenv("TAR_CACHE_PATH")
+
+LAUNCH_WORKERS = int(os.getenv("LAUNCH_WORKERS", "0"))
+LAUNCH_QUEUE_SIZE = int(os.getenv("LAUNCH_QUEUE_SIZE", "256"))
+
+DOCKER_HOSTS = [host for host in os.getenv("DOCKER_HOSTS", "").split(",") if host]
+
+CONTAINER_IDLE_TTL = int(os.getenv("CONTAINER_IDLE_TTL", "0"))
+LIFECYCLE_INTERVAL = int(os.getenv("LIFECYCLE_INTERVAL", "60"))
+
+IMAGE_CATALOG_INTERVAL = int(os.getenv("IMAGE_CATALOG_INTERVAL", "3600"))
+
+LAUNCH_SLOW_THRESHOLD = float(os.getenv("LAUNCH_SLOW_THRESHOLD", "0"))
+
+LAUNCH_TIMEOUT = int(os.getenv("LAUNCH_TIMEOUT", "300"))
+LAUNCH_RATE_LIMIT = int(os.getenv("LAUNCH_RATE_LIMIT", "10"))
+LAUNCH_RATE_WINDOW = int(os.getenv("LAUNCH_RATE_WINDOW", "60"))
+LAUNCH_RETRY_AFTER = int(os.getenv("LAUNCH_RETRY_AFTER", "10"))
+MAX_CONTAINERS = int(os.getenv("MAX_CONTAINERS", "0"))
+MAX_MEMORY_COMMIT = float(os.getenv("MAX_MEMORY_COMMIT", "0"))
+
+CHALLENGE_INDEX_INTERVAL = int(os.getenv("CHALLENGE_INDEX_INTERVAL", "300"))
+
+CHEATER_QUEUE_SIZE = int(os.getenv("CHEATER_QUEUE_SIZE", "1024"))
+CHEATER_BATCH_SIZE = int(os.getenv("CHEATER_BATCH_SIZE", "100"))
+CHEATER_FLUSH_INTERVAL = float(os.getenv("CHEATER_FLUSH_INTERVAL", "1"))
+CHEATER_GRAPH_REBUILD_INTERVAL = int(
+    os.getenv("CHEATER_GRAPH_REBUILD_INTERVAL", "3600")
+)
+
+# "legacy" keeps issuing itsdangerous flags while old workers are still running
+USER_FLAG_FORMAT = os.getenv("USER_FLAG_FORMAT", "compact")
+
+SCOREBOARD_REBUILD_INTERVAL = int(os.getenv("SCOREBOARD_REBUILD_INTERVAL", "300"))
@@ -0,0 +1,97 @@
+import io
+import os
+import mmap
+import tarfile
+import tempfile
+import threading
+import collections
+
+from .settings import TAR_CACHE_SIZE, TAR_CACHE_PATH
+
+
+def tar_segment(path, arcname, *, mode=None, uid=0, gid=0):
+    """Tar members for `path` without the end of archive marker, so they can be concatenated."""
+
+    def set_owner(tarinfo):
+        if mode is not None:
+            tarinfo.mode = mode
+        tarinfo.uid = uid
+        tarinfo.gid = gid
+        tarinfo.uname = ""
+        tarinfo.gname = ""
+        return tarinfo
+
+    f = io.BytesIO()
+    t = tarfile.open(mode="w", fileobj=f)
+    t.add(os.path.abspath(path), arcname=arcname, filter=set_owner)
+    # Closing the tarfile would write the end of archive marker
+    return f.getvalue()
+
+
+def path_fingerprint(path):
+    def entry(full_path):
+        st = os.lstat(full_path)
+        return (
+            os.path.relpath(full_path, path),
+            st.st_mode,
+            st.st_size,
+            st.st_mtime_ns,
+        )
+
+    entries = [entry(path)]
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        entries.extend(entry(os.path.join(root, name)) for name in sorted(files))
+        entries.extend(entry(os.path.join(root, name)) for name in dirs)
+    return tuple(entries)
+
+
+class TarCache:
+    def __init__(self, max_bytes, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, arcname, *, mode=None):
+        key = (path, arcname, mode)
+        fingerprint = path_fingerprint(path)
+
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached and cached[0] == fingerprint:
+                self.entries.move_to_end(key)
+                return cached[1]
+
+        segment = tar_segment(path, arcname, mode=mode)
+        if len(segment) > self.max_bytes:
+            return segment
+
+        data = self.store(segment)
+        with self.lock:
+            self.discard(key)
+            self.entries[key] = (fingerprint, data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                self.discard(next(iter(self.entries)))
+        return data
+
+    def store(self, segment):
+        if not self.directory or not segment:
+            return segment
+
+        with tempfile.TemporaryFile(dir=self.directory) as f:
+            f.write(segment)
+            f.flush()
+            return mmap.mmap(f.fileno(), len(segment), access=mmap.ACCESS_READ)
+
+    def discard(self, key):
+        cached = self.entries.pop(key, None)
+        if not cached:
+            return
+        _, data = cached
+        self.total_bytes -= len(data)
+
+
+tar_cache = TarCache(TAR_CACHE_SIZE, TAR_CACHE_PATH)
@@ -3,6 +3,9 @@ from CTFd.utils.user import get_current_user
 from CTFd.utils.decorators import authed_only
 
 from .settings import INSTANCE
+from .lifecycle import touch_container
+from .container_index import container_index
+from .docker_hosts import LOCAL_HOST, user_host, host_websocket_url
 
 
 terminal = Blueprint("terminal", __name__, template_folder="assets/terminal/")
@@ -16,7 +19,17 @@ def terminal_ws():
     user = get_current_user()
     container_name = f"{INSTANCE}_user_{user.id}"
 
-    redirect_uri = f"http://unix:/tmp/docker.sock:/containers/{container_name}/attach/ws?logs=0&stream=1&stdin=1&stdout=1&stderr=1"
+    entry = container_index.get(user.id)
+    if entry:
+        host = entry["host"]
+    else:
+        host = user_host(user.id) or LOCAL_HOST
+    redirect_uri = host_websocket_url(
+        host,
+        f"/containers/{container_name}/attach/ws?logs=0&stream=1&stdin=1&stdout=1&stderr=1",
+    )
+
+    touch_container(user.id)
 
     response.headers["X-Accel-Redirect"] = "/internal-ws/"
     response.headers["redirect_uri"] = redirect_uri
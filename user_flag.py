@@ -1,15 +1,25 @@
 import sys
+import queue
+import atexit
 import datetime
+import threading
 
 from flask import request
 from flask_restx import Namespace, Resource
 from sqlalchemy.exc import IntegrityError
 from CTFd.models import db, Challenges
+from CTFd.cache import cache
 from CTFd.plugins.flags import BaseFlag, FlagException
 from CTFd.utils.user import get_current_user
 from CTFd.utils.decorators import authed_only
 
 from .utils import unserialize_user_flag, BadSignature
+from .settings import (
+    INSTANCE,
+    CHEATER_QUEUE_SIZE,
+    CHEATER_BATCH_SIZE,
+    CHEATER_FLUSH_INTERVAL,
+)
 
 
 class Cheaters(db.Model):
@@ -49,6 +59,108 @@ class MultiSolves(db.Model):
     challenge_data = db.Column(db.String(80), primary_key=True)
 
 
+# Challenge categories rarely change, but an edit should show up eventually
+CHALLENGE_CATEGORIES_TIMEOUT = 300
+
+
+def challenge_category(challenge_id):
+    key = f"{INSTANCE}_challenge_categories"
+    categories = cache.get(key) or {}
+    if challenge_id not in categories:
+        categories = dict(db.session.query(Challenges.id, Challenges.category))
+        cache.set(key, categories, timeout=CHALLENGE_CATEGORIES_TIMEOUT)
+    return categories.get(challenge_id)
+
+
+def multi_solves_key(user_id, category):
+    return f"{INSTANCE}_multi_solves_{user_id}_{category}"
+
+
+def multi_solved(user_id, category):
+    key = multi_solves_key(user_id, category)
+    solved = cache.get(key)
+    if solved is None:
+        solves = MultiSolves.query.filter_by(
+            user_id=user_id, challenge_category=category
+        )
+        solved = [solve.challenge_data for solve in solves]
+        cache.set(key, solved, timeout=0)
+    return solved
+
+
+class CheaterLog:
+    """Write-behind queue for Cheaters records, flushed in batches by a background thread."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def record(self, **cheater):
+        cheater.setdefault("date", datetime.datetime.utcnow())
+        if self.thread is None or self.stopping.is_set():
+            self.write([cheater])
+            return
+        try:
+            self.queue.put_nowait(cheater)
+        except queue.Full:
+            # Cheater records are never dropped, a full queue makes the submission wait
+            self.write([cheater])
+
+    def write(self, cheaters):
+        db.session.bulk_insert_mappings(Cheaters, cheaters)
+        db.session.commit()
+
+    def take(self, timeout=None):
+        cheaters = []
+        try:
+            cheaters.append(self.queue.get(timeout=timeout))
+            while len(cheaters) < CHEATER_BATCH_SIZE:
+                cheaters.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return cheaters
+
+    def flush(self, app, cheaters):
+        with app.app_context():
+            try:
+                self.write(cheaters)
+            except Exception as e:
+                db.session.rollback()
+                print(
+                    f"Failed to write {len(cheaters)} cheater records: {e}",
+                    file=sys.stderr,
+                    flush=True,
+                )
+
+    def writer_loop(self, app):
+        while not self.stopping.is_set():
+            cheaters = self.take(timeout=CHEATER_FLUSH_INTERVAL)
+            if cheaters:
+                self.flush(app, cheaters)
+
+    def stop(self, app):
+        self.stopping.set()
+        self.thread.join()
+        while True:
+            cheaters = self.take(timeout=0)
+            if not cheaters:
+                break
+            self.flush(app, cheaters)
+
+    def start(self, app):
+        if not self.queue.maxsize:
+            return
+        self.thread = threading.Thread(
+            target=self.writer_loop, args=(app,), daemon=True
+        )
+        self.thread.start()
+        atexit.register(self.stop, app)
+
+
+cheater_log = CheaterLog(CHEATER_QUEUE_SIZE)
+
+
 class UserFlag(BaseFlag):
     name = "user"
     templates = {  # Nunjucks templates used for key editing & viewing
@@ -80,15 +192,13 @@ class UserFlag(BaseFlag):
                 file=sys.stderr,
             )
 
-            cheater = Cheaters(
+            cheater_log.record(
                 cheater_id=current_account_id,
                 cheatee_id=account_id,
                 cheater_challenge_id=current_challenge_id,
                 cheatee_challenge_id=challenge_id,
                 challenge_data=challenge_data,
             )
-            db.session.add(cheater)
-            db.session.commit()
 
             if option_cheater and challenge_id == current_challenge_id:
                 return True
@@ -106,16 +216,17 @@ class UserFlag(BaseFlag):
             raise FlagException("Error: this challenge is not correctly configured")
 
         if option_multi:
-            challenge = Challenges.query.filter_by(id=current_challenge_id).first()
+            category = challenge_category(current_challenge_id)
 
             multi_solve = MultiSolves(
                 user_id=account_id,
-                challenge_category=challenge.category,
+                challenge_category=category,
                 challenge_data=challenge_data,
             )
             try:
                 db.session.add(multi_solve)
                 db.session.commit()
+                cache.delete(multi_solves_key(account_id, category))
                 return True
             except IntegrityError:
                 db.session.rollback()
@@ -135,9 +246,6 @@ class MultiSolved(Resource):
     def get(self, category):
         user = get_current_user()
 
-        solves = MultiSolves.query.filter_by(
-            user_id=user.account_id, challenge_category=category
-        )
-        solved = [solve.challenge_data for solve in solves]
+        solved = multi_solved(user.account_id, category)
 
         return {"success": True, "solved": solved}
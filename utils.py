@@ -1,37 +1,121 @@
 import os
 import re
+import hmac
+import base64
+import struct
+import hashlib
+import binascii
+import functools
 
 from flask import current_app
 from itsdangerous.url_safe import URLSafeSerializer
 from itsdangerous.exc import BadSignature
 
-from .settings import INSTANCE
+from .settings import INSTANCE, CHALLENGES_PATH, USER_FLAG_FORMAT
+from .challenge_index import challenge_index
 
 
-def serialize_user_flag(account_id, challenge_id, challenge_data=None, *, secret=None):
-    if secret is None:
-        secret = current_app.config["SECRET_KEY"]
+USER_FLAG_ENVELOPE = re.compile(".+?{(.+)}")
+
+# Compact flags: version, data kind, account id, challenge id, data, truncated HMAC
+COMPACT_USER_FLAG_VERSION = 1
+COMPACT_USER_FLAG_HEADER = struct.Struct(">BBII")
+COMPACT_USER_FLAG_MAC_SIZE = 12
+COMPACT_USER_FLAG_DATA_NONE = 0
+COMPACT_USER_FLAG_DATA_STR = 1
+COMPACT_USER_FLAG_DATA_INT = 2
+
+
+@functools.lru_cache(maxsize=16)
+def user_flag_serializer(secret):
+    return URLSafeSerializer(secret)
+
+
+@functools.lru_cache(maxsize=16)
+def user_flag_key(secret):
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return hmac.new(secret, b"pwn.college compact user flag", hashlib.sha256).digest()
 
-    serializer = URLSafeSerializer(secret)
 
+def legacy_user_flag(secret, account_id, challenge_id, challenge_data=None):
     data = [account_id, challenge_id]
     if challenge_data is not None:
         data.append(challenge_data)
 
-    user_flag = serializer.dumps(data)[::-1]
+    return user_flag_serializer(secret).dumps(data)[::-1]
 
-    return user_flag
 
+def compact_user_flag(secret, account_id, challenge_id, challenge_data=None):
+    if challenge_data is None:
+        kind, data = COMPACT_USER_FLAG_DATA_NONE, b""
+    elif isinstance(challenge_data, int):
+        kind, data = COMPACT_USER_FLAG_DATA_INT, struct.pack(">q", challenge_data)
+    else:
+        kind, data = COMPACT_USER_FLAG_DATA_STR, str(challenge_data).encode()
 
-def unserialize_user_flag(user_flag, *, secret=None):
+    payload = (
+        COMPACT_USER_FLAG_HEADER.pack(
+            COMPACT_USER_FLAG_VERSION, kind, account_id, challenge_id
+        )
+        + data
+    )
+    mac = hmac.new(user_flag_key(secret), payload, hashlib.sha256).digest()
+    payload += mac[:COMPACT_USER_FLAG_MAC_SIZE]
+
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def serialize_user_flag(account_id, challenge_id, challenge_data=None, *, secret=None):
     if secret is None:
         secret = current_app.config["SECRET_KEY"]
 
-    user_flag = re.sub(".+?{(.+)}", r"\1", user_flag)[::-1]
+    if USER_FLAG_FORMAT == "legacy":
+        return legacy_user_flag(secret, account_id, challenge_id, challenge_data)
+    return compact_user_flag(secret, account_id, challenge_id, challenge_data)
+
+
+def load_compact_user_flag(secret, user_flag):
+    try:
+        payload = base64.urlsafe_b64decode(user_flag + "=" * (-len(user_flag) % 4))
+    except (ValueError, binascii.Error):
+        raise BadSignature("Invalid compact flag encoding")
+
+    header_size = COMPACT_USER_FLAG_HEADER.size
+    if len(payload) < header_size + COMPACT_USER_FLAG_MAC_SIZE:
+        raise BadSignature("Truncated compact flag")
+
+    mac = payload[-COMPACT_USER_FLAG_MAC_SIZE:]
+    payload = payload[:-COMPACT_USER_FLAG_MAC_SIZE]
+    expected_mac = hmac.new(user_flag_key(secret), payload, hashlib.sha256).digest()
+    if not hmac.compare_digest(mac, expected_mac[:COMPACT_USER_FLAG_MAC_SIZE]):
+        raise BadSignature("Compact flag signature does not match")
+
+    version, kind, account_id, challenge_id = COMPACT_USER_FLAG_HEADER.unpack_from(
+        payload
+    )
+    data = payload[header_size:]
+    if version != COMPACT_USER_FLAG_VERSION:
+        raise BadSignature(f"Unknown compact flag version {version}")
+
+    if kind == COMPACT_USER_FLAG_DATA_STR:
+        challenge_data = data.decode()
+    elif kind == COMPACT_USER_FLAG_DATA_INT:
+        (challenge_data,) = struct.unpack(">q", data)
+    else:
+        challenge_data = None
+
+    return account_id, challenge_id, challenge_data
+
 
-    serializer = URLSafeSerializer(secret)
+def load_user_flag(secret, user_flag):
+    user_flag = USER_FLAG_ENVELOPE.sub(r"\1", user_flag)
 
-    data = serializer.loads(user_flag)
+    # itsdangerous payloads always contain a ".", which base64url never does
+    if "." not in user_flag:
+        return load_compact_user_flag(secret, user_flag)
+
+    data = user_flag_serializer(secret).loads(user_flag[::-1])
     data.append(None)
 
     account_id, challenge_id, challenge_data, *_ = data
@@ -39,7 +123,29 @@ def unserialize_user_flag(user_flag, *, secret=None):
     return account_id, challenge_id, challenge_data
 
 
-def challenge_path(account_id, category, challenge):
+def unserialize_user_flag(user_flag, *, secret=None):
+    if secret is None:
+        secret = current_app.config["SECRET_KEY"]
+
+    return load_user_flag(secret, user_flag)
+
+
+def unserialize_user_flags(user_flags, *, secret=None):
+    """Verify many flags against one secret, with None in place of each bad signature."""
+    if secret is None:
+        secret = current_app.config["SECRET_KEY"]
+
+    results = []
+    for user_flag in user_flags:
+        try:
+            results.append(load_user_flag(secret, user_flag))
+        except BadSignature:
+            results.append(None)
+
+    return results
+
+
+def challenge_entry(account_id, category, challenge):
     account_id = str(account_id)
 
     def is_safe(segment):
@@ -48,11 +154,19 @@ def challenge_path(account_id, category, challenge):
     if not is_safe(account_id) or not is_safe(category) or not is_safe(challenge):
         return None
 
-    paths = [
-        os.path.join("/", "challenges", account_id, category, challenge),
-        os.path.join("/", "challenges", "global", category, challenge),
-    ]
+    for owner in (account_id, "global"):
+        path = os.path.join(CHALLENGES_PATH, owner, category, challenge)
+        if challenge_index.ready:
+            is_dir = challenge_index.lookup(owner, category, challenge)
+        elif os.path.exists(path):
+            is_dir = os.path.isdir(path)
+        else:
+            is_dir = None
+        if is_dir is not None:
+            return path, is_dir
 
-    for path in paths:
-        if os.path.exists(path):
-            return path
+
+def challenge_path(account_id, category, challenge):
+    entry = challenge_entry(account_id, category, challenge)
+    if entry:
+        return entry[0]
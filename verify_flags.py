@@ -0,0 +1,117 @@
+import os
+import csv
+import sys
+import json
+import itertools
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .utils import unserialize_user_flags
+
+
+def read_submissions(file, format):
+    if format == "csv":
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def submission_mismatch(submission, result):
+    if result is None:
+        return "invalid"
+
+    account_id, challenge_id, challenge_data = result
+    if account_id == 0 and challenge_id == 0 and challenge_data == 0:
+        return "practice"
+    if str(account_id) != str(submission["account_id"]):
+        return "owner"
+    if str(challenge_id) != str(submission.get("challenge_id")):
+        return "challenge"
+
+
+def verify_submissions(secret, submissions):
+    # A row without a flag fails verification, so it is reported as invalid
+    results = unserialize_user_flags(
+        [str(submission.get("provided") or "") for submission in submissions],
+        secret=secret,
+    )
+
+    mismatches = []
+    for submission, result in zip(submissions, results):
+        mismatch = submission_mismatch(submission, result)
+        if not mismatch:
+            continue
+        flag_account_id, flag_challenge_id, flag_challenge_data = result or [None] * 3
+        mismatches.append(
+            {
+                "mismatch": mismatch,
+                **submission,
+                "flag_account_id": flag_account_id,
+                "flag_challenge_id": flag_challenge_id,
+                "flag_challenge_data": flag_challenge_data,
+            }
+        )
+    return len(submissions), mismatches
+
+
+@click.command("verify-flags")
+@click.argument("submissions", type=click.File("r"))
+@click.option("--format", type=click.Choice(["csv", "jsonl"]), default=None)
+@click.option("--output", type=click.File("w"), default="-")
+@click.option("--workers", type=int, default=os.cpu_count())
+@click.option("--batch-size", type=int, default=10000)
+@click.option("--secret", default=None, help="Defaults to the app's SECRET_KEY.")
+@with_appcontext
+def verify_flags_command(submissions, format, output, workers, batch_size, secret):
+    """Re-verify exported flag submissions and report the ones that do not match.
+
+    SUBMISSIONS is a CSV or JSON Lines export with account_id (or user_id),
+    challenge_id and provided columns, such as CTFd's submissions table. Each
+    mismatch (invalid, practice, owner or challenge) is written to the output as
+    a JSON line as soon as it is found.
+    """
+    if secret is None:
+        secret = current_app.config["SECRET_KEY"]
+    if format is None:
+        format = "csv" if submissions.name.endswith(".csv") else "jsonl"
+
+    def normalized_submissions():
+        for submission in read_submissions(submissions, format):
+            if "account_id" not in submission:
+                submission["account_id"] = submission.get("user_id")
+            yield submission
+
+    rows = normalized_submissions()
+    batches = iter(lambda: list(itertools.islice(rows, batch_size)), [])
+
+    counts = collections.Counter()
+
+    def report(future):
+        verified, mismatches = future.result()
+        counts["verified"] += verified
+        for mismatch in mismatches:
+            counts[mismatch["mismatch"]] += 1
+            output.write(json.dumps(mismatch, default=str) + "\n")
+        output.flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only a couple of batches per worker are in flight at once, so memory stays
+        # bounded no matter how large the export is
+        pending = collections.deque()
+        for batch in batches:
+            if len(pending) >= workers * 2:
+                report(pending.popleft())
+            pending.append(executor.submit(verify_submissions, secret, batch))
+        while pending:
+            report(pending.popleft())
+
+    print(
+        ", ".join(f"{count} {name}" for name, count in counts.items()),
+        file=sys.stderr,
+    )